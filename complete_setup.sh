@@ -25,7 +25,7 @@ echo -e "${GREEN}Creating systemd service for FastAPI server...${NC}"
 sudo tee /etc/systemd/system/sensor-server.service > /dev/null <<EOF
 [Unit]
 Description=FastAPI Sensor Server
-After=network.target
+After=network.target pigpiod.service
 Wants=cloudflared.service
 
 [Service]
@@ -35,7 +35,13 @@ Group=$PI_USER
 WorkingDirectory=$WORKDIR
 Environment="PATH=$VENV_DIR/bin"
 Environment="PYTHONPATH=$WORKDIR"
-ExecStart=$VENV_DIR/bin/uvicorn server:app --host 0.0.0.0 --port $SERVER_PORT --reload
+# Real-time priority and locked memory for the sensor timing loops
+AmbientCapabilities=CAP_SYS_NICE CAP_IPC_LOCK
+LimitRTPRIO=99
+LimitMEMLOCK=infinity
+# One worker only: the sensor loops own the GPIO pins. No --reload, its file watcher
+# only costs CPU in production
+ExecStart=$VENV_DIR/bin/uvicorn server:app --host 0.0.0.0 --port $SERVER_PORT --loop uvloop --http httptools
 Restart=always
 RestartSec=10
 
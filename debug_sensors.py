@@ -4,260 +4,728 @@ Sensor Debugging Script for Raspberry Pi
 This script will help diagnose issues with your sensor connections
 """
 
+import os
+import re
+import glob
 import time
-import sys
-from datetime import datetime
+import mmap
+import ctypes
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from statistics import fmean
 
 # Check if we're on Raspberry Pi
 try:
     import RPi.GPIO as GPIO
-    import Adafruit_DHT
     SIMULATION_MODE = False
-    print("✓ Successfully imported RPi.GPIO and Adafruit_DHT")
+    print("✓ Successfully imported RPi.GPIO")
 except ImportError as e:
     print(f"✗ Import Error: {e}")
     print("Please install required packages:")
     print("sudo apt update")
-    print("sudo apt install python3-pip")
-    print("pip3 install RPi.GPIO")
-    print("pip3 install Adafruit_DHT")
-    sys.exit(1)
+    print("sudo apt install python3-pip pigpio")
+    print("pip3 install RPi.GPIO pigpio")
+    raise SystemExit(1)
+
+# pigpio timestamps edges from its DMA sampler; optional, needs pigpiod running
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
 
 # Pin definitions (matching your code)
-ULTRASONIC_TRIGGER = 18
-ULTRASONIC_ECHO = 24
-MQ135_DIGITAL = 25
-MQ135_ANALOG = 26
-DHT11_DATA = 22
-LDR_PIN = 21
-PIR_DATA = 23
+class Pin(IntEnum):
+    ULTRASONIC_TRIGGER = 18
+    ULTRASONIC_ECHO = 24
+    MQ135_DIGITAL = 25
+    MQ135_ANALOG = 26
+    DHT11_DATA = 22
+    LDR_PIN = 21
+    PIR_DATA = 23
+
+# Core reserved for sensor timing (isolate it with setup_isolcpu.sh)
+SENSOR_CPU = 3
+
+# Pin modes applied in one batch at startup
+PIN_MODES = {
+    Pin.ULTRASONIC_TRIGGER: 'out',
+    Pin.ULTRASONIC_ECHO: 'in',
+    Pin.MQ135_DIGITAL: 'in',
+    Pin.MQ135_ANALOG: 'in',
+    Pin.DHT11_DATA: 'in',
+    Pin.LDR_PIN: 'in',
+    Pin.PIR_DATA: 'in',
+}
+
+@dataclass
+class SensorResult:
+    """Outcome of one sensor test"""
+    name: str
+    ok: bool
+    duration_ms: float = 0.0
+    reading: float = float('nan')
+
+def timed(test):
+    """Run a sensor test and record how long it took"""
+    start = time.monotonic()
+    result = test()
+    result.duration_ms = (time.monotonic() - start) * 1000
+    return result
+
+# Shared pigpio connection, set up in setup_gpio() (None when unavailable)
+pi = None
+
+class FastGPIO:
+    """Direct BCM283x/BCM2711 GPIO register access through /dev/gpiomem"""
+    # Word offsets into the GPIO register block
+    GPFSEL0 = 0
+    GPSET0 = 7
+    GPCLR0 = 10
+    GPLEV0 = 13
+    FSEL_BITS = {'in': 0b000, 'out': 0b001}
+
+    def __init__(self):
+        with open('/dev/gpiomem', 'r+b') as f:
+            self._mem = mmap.mmap(f.fileno(), 4096)
+        self._regs = memoryview(self._mem).cast('I')
+
+    def configure(self, modes):
+        """Set all pin modes with a single store to the GPFSEL registers"""
+        last = max(modes) // 10
+        fsel = list(self._regs[self.GPFSEL0:self.GPFSEL0 + last + 1])
+        for pin, mode in modes.items():
+            shift = 3 * (pin % 10)
+            fsel[pin // 10] = (fsel[pin // 10] & ~(7 << shift)) | (self.FSEL_BITS[mode] << shift)
+        self._regs[self.GPFSEL0:self.GPFSEL0 + last + 1] = array('I', fsel)
+
+    def _set_fsel(self, pin, bits):
+        reg = self.GPFSEL0 + pin // 10
+        shift = 3 * (pin % 10)
+        # Pins share GPFSEL words, so serialize the read-modify-write
+        with gpio_lock:
+            self._regs[reg] = (self._regs[reg] & ~(7 << shift)) | (bits << shift)
+
+    def set_output(self, pin):
+        self._set_fsel(pin, self.FSEL_BITS['out'])
+
+    def set_input(self, pin):
+        self._set_fsel(pin, self.FSEL_BITS['in'])
+
+    def set(self, pin):
+        self._regs[self.GPSET0] = 1 << pin
+
+    def clear(self, pin):
+        self._regs[self.GPCLR0] = 1 << pin
+
+    def level(self, pin):
+        return (self._regs[self.GPLEV0] >> pin) & 1
+
+    def close(self):
+        self._regs.release()
+        self._mem.close()
+
+# Register-level GPIO, set up in setup_gpio() (None when unavailable)
+fast_gpio = None
+
+def open_fast_gpio():
+    """Map the GPIO registers, or return None if this Pi can't use them"""
+    try:
+        with open('/proc/device-tree/compatible', 'rb') as f:
+            if b'bcm2712' in f.read():
+                return None  # Pi 5 GPIO sits behind RP1 with a different register map
+        return FastGPIO()
+    except OSError:
+        return None
+
+# RPi.GPIO's setup path isn't thread-safe; tests run concurrently
+gpio_lock = threading.Lock()
+
+def gpio_setup(pin, direction):
+    """GPIO.setup() serialized across test threads"""
+    with gpio_lock:
+        GPIO.setup(pin, direction)
+
+_libc = ctypes.CDLL("libc.so.6", use_errno=True)
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+# mlockall is process-wide, so only unlock when the last timed block exits
+_mlock_lock = threading.Lock()
+_mlock_depth = 0
+
+@contextmanager
+def realtime_priority(priority=80):
+    """Run the block under SCHED_FIFO with memory locked (needs root)"""
+    global _mlock_depth
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        elevated = True
+    except OSError:
+        elevated = False
+    with _mlock_lock:
+        if _mlock_depth == 0:
+            _libc.mlockall(MCL_CURRENT | MCL_FUTURE)
+        _mlock_depth += 1
+    try:
+        yield elevated
+    finally:
+        with _mlock_lock:
+            _mlock_depth -= 1
+            if _mlock_depth == 0:
+                _libc.munlockall()
+        if elevated:
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+
+def set_cpu_governor(governor):
+    """Set the cpufreq governor on all cores, returning the previous settings"""
+    previous = {}
+    for path in glob.glob('/sys/devices/system/cpu/cpu*/cpufreq/scaling_governor'):
+        try:
+            with open(path) as f:
+                current = f.read().strip()
+            with open(path, 'w') as f:
+                f.write(governor)
+            previous[path] = current
+        except OSError:
+            pass
+    return previous
+
+def restore_cpu_governor(previous):
+    """Restore governors saved by set_cpu_governor()"""
+    for path, governor in previous.items():
+        try:
+            with open(path, 'w') as f:
+                f.write(governor)
+        except OSError:
+            pass
+
+# Compiled echo timer, set up in setup_gpio() (None when not built)
+ultrasonic_lib = None
+
+def load_ultrasonic_lib():
+    """Load ultrasonic.so built from ultrasonic.c next to this script"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ultrasonic.so')
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError:
+        return None
+    lib.measure.argtypes = (ctypes.c_uint, ctypes.c_uint, ctypes.c_uint64)
+    lib.measure.restype = ctypes.c_uint64
+    return lib
+
+def connect_pigpio():
+    """Connect to the pigpio daemon, or return None if it is unavailable"""
+    if pigpio is None:
+        return None
+    conn = pigpio.pi()
+    if not conn.connected:
+        print("⚠ pigpiod not running - start it with: sudo systemctl start pigpiod")
+        return None
+    return conn
 
 def setup_gpio():
     """Setup GPIO with proper error handling"""
+    global pi, fast_gpio, ultrasonic_lib
     try:
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         print("✓ GPIO setup successful")
+        fast_gpio = open_fast_gpio()
+        if fast_gpio is not None:
+            fast_gpio.configure(PIN_MODES)
+            print("✓ Pin modes configured via /dev/gpiomem")
+            ultrasonic_lib = load_ultrasonic_lib()
+            if ultrasonic_lib is not None:
+                print("✓ Loaded compiled ultrasonic timer")
+        pi = connect_pigpio()
+        if pi is not None:
+            print("✓ Connected to pigpiod")
         return True
     except Exception as e:
         print(f"✗ GPIO setup failed: {e}")
         return False
 
+def measure_echo_native():
+    """Measure the HC-SR04 echo width in microseconds with the compiled timer"""
+    fast_gpio.configure({Pin.ULTRASONIC_TRIGGER: 'out', Pin.ULTRASONIC_ECHO: 'in'})
+    fast_gpio.clear(Pin.ULTRASONIC_TRIGGER)
+    time.sleep(0.1)
+    width_ns = ultrasonic_lib.measure(Pin.ULTRASONIC_TRIGGER, Pin.ULTRASONIC_ECHO,
+                                      500_000_000)
+    if width_ns == 0:
+        print("✗ Timeout waiting for echo")
+        return None
+    return width_ns / 1000
+
+def measure_echo_pigpio():
+    """Measure the HC-SR04 echo width in microseconds from pigpio edge ticks"""
+    rising_tick = None
+    falling_tick = None
+    echo_done = threading.Event()
+
+    def _edge_cb(gpio, level, tick):
+        nonlocal rising_tick, falling_tick
+        if level == 1:
+            rising_tick = tick
+        elif level == 0 and rising_tick is not None:
+            falling_tick = tick
+            echo_done.set()
+
+    pi.set_mode(Pin.ULTRASONIC_TRIGGER, pigpio.OUTPUT)
+    pi.set_mode(Pin.ULTRASONIC_ECHO, pigpio.INPUT)
+    pi.write(Pin.ULTRASONIC_TRIGGER, 0)
+    time.sleep(0.1)
+
+    cb = pi.callback(Pin.ULTRASONIC_ECHO, pigpio.EITHER_EDGE, _edge_cb)
+    try:
+        # Hardware-timed 10us trigger pulse
+        pi.gpio_trigger(Pin.ULTRASONIC_TRIGGER, 10, 1)
+        if not echo_done.wait(0.5):
+            print("✗ Timeout waiting for echo")
+            return None
+        return pigpio.tickDiff(rising_tick, falling_tick)
+    finally:
+        cb.cancel()
+
+def rc_charge_time_pigpio(pin, discharge_s, timeout_s):
+    """Measure RC charge time in microseconds from a pigpio rising-edge tick"""
+    charged_tick = None
+    charged = threading.Event()
+
+    def _edge_cb(gpio, level, tick):
+        nonlocal charged_tick
+        charged_tick = tick
+        charged.set()
+
+    # Discharge capacitor
+    pi.set_mode(pin, pigpio.OUTPUT)
+    pi.write(pin, 0)
+    time.sleep(discharge_s)
+
+    cb = pi.callback(pin, pigpio.RISING_EDGE, _edge_cb)
+    try:
+        # Start the clock before releasing the pin so the edge can't precede it
+        start_tick = pi.get_current_tick()
+        pi.set_mode(pin, pigpio.INPUT)
+        if not charged.wait(timeout_s):
+            return int(timeout_s * 1e6)
+        return pigpio.tickDiff(start_tick, charged_tick)
+    finally:
+        cb.cancel()
+
+def read_dht11_pigpio(pin):
+    """Read (humidity, temperature) from a DHT11 by timing its pulses with pigpio"""
+    # High-pulse widths in us: host release + sensor response + 40 data bits
+    highs = array('I', [0] * 42)
+    count = 0
+    last_rise = None
+
+    def _edge_cb(gpio, level, tick):
+        nonlocal count, last_rise
+        if level == 1:
+            last_rise = tick
+        elif level == 0 and last_rise is not None and count < len(highs):
+            highs[count] = pigpio.tickDiff(last_rise, tick)
+            count += 1
+
+    # 18ms start pulse, then release the line to the pull-up
+    pi.set_pull_up_down(pin, pigpio.PUD_UP)
+    pi.set_mode(pin, pigpio.OUTPUT)
+    pi.write(pin, 0)
+    time.sleep(0.018)
+
+    cb = pi.callback(pin, pigpio.EITHER_EDGE, _edge_cb)
+    try:
+        pi.set_mode(pin, pigpio.INPUT)
+        time.sleep(0.05)  # Full frame is ~4ms; allow for callback delivery
+    finally:
+        cb.cancel()
+
+    if count < 40:
+        return None, None
+
+    # A bit is 1 when its high pulse is ~70us, 0 when ~27us
+    data = bytearray(5)
+    for i, width in enumerate(highs[count - 40:count]):
+        data[i // 8] = (data[i // 8] << 1) | (width > 50)
+    if (sum(data[:4]) & 0xFF) != data[4]:
+        return None, None
+
+    humidity = data[0] + data[1] / 10
+    temperature = data[2] + (data[3] & 0x7F) / 10
+    if data[3] & 0x80:
+        temperature = -temperature
+    return humidity, temperature
+
+def send_trigger_pulse(trigger_on, trigger_off, width_ns=10_000):
+    """Emit the 10us trigger pulse by spinning; time.sleep() can't go below ~100us"""
+    end_ns = time.monotonic_ns() + width_ns
+    trigger_on()
+    while time.monotonic_ns() < end_ns:
+        pass
+    trigger_off()
+
+def measure_echo_events():
+    """Measure the HC-SR04 echo width in microseconds from RPi.GPIO edge events"""
+    edges_ns = []
+    echo_done = threading.Event()
+
+    def _edge_cb(channel):
+        edges_ns.append(time.monotonic_ns())
+        if len(edges_ns) == 2:
+            echo_done.set()
+
+    gpio_setup(Pin.ULTRASONIC_TRIGGER, GPIO.OUT)
+    gpio_setup(Pin.ULTRASONIC_ECHO, GPIO.IN)
+    GPIO.output(Pin.ULTRASONIC_TRIGGER, False)
+    time.sleep(0.1)
+
+    # Arm before triggering so the rising edge can't be missed; the
+    # library's epoll thread timestamps each edge as it wakes
+    with gpio_lock:
+        GPIO.add_event_detect(Pin.ULTRASONIC_ECHO, GPIO.BOTH, callback=_edge_cb)
+    try:
+        send_trigger_pulse(lambda: GPIO.output(Pin.ULTRASONIC_TRIGGER, True),
+                           lambda: GPIO.output(Pin.ULTRASONIC_TRIGGER, False))
+
+        # One blocking wait instead of a clock check per loop iteration
+        if not echo_done.wait(0.5):
+            print("✗ Timeout waiting for echo")
+            return None
+        return (edges_ns[1] - edges_ns[0]) / 1000
+    finally:
+        with gpio_lock:
+            GPIO.remove_event_detect(Pin.ULTRASONIC_ECHO)
+
+def measure_echo_polling():
+    """Measure the HC-SR04 echo width in microseconds by polling the echo pin"""
+    if fast_gpio is not None:
+        # Pins were configured in setup_gpio(); drive registers directly
+        read_echo = fast_gpio.level
+        trigger_on = lambda: fast_gpio.set(Pin.ULTRASONIC_TRIGGER)
+        trigger_off = lambda: fast_gpio.clear(Pin.ULTRASONIC_TRIGGER)
+    else:
+        gpio_setup(Pin.ULTRASONIC_TRIGGER, GPIO.OUT)
+        gpio_setup(Pin.ULTRASONIC_ECHO, GPIO.IN)
+        read_echo = GPIO.input
+        trigger_on = lambda: GPIO.output(Pin.ULTRASONIC_TRIGGER, True)
+        trigger_off = lambda: GPIO.output(Pin.ULTRASONIC_TRIGGER, False)
+    
+    # Initial state
+    trigger_off()
+    time.sleep(0.1)
+    
+    # Send trigger pulse
+    send_trigger_pulse(trigger_on, trigger_off)
+    
+    # Wait for echo (integer nanoseconds, immune to wall-clock steps).
+    # Locals keep the hot loops on LOAD_FAST instead of global/attr lookups.
+    _mono = time.monotonic_ns
+    _echo_pin = Pin.ULTRASONIC_ECHO
+    deadline_ns = _mono() + 500_000_000  # 500ms timeout
+    pulse_start_ns = pulse_end_ns = _mono()
+    while not read_echo(_echo_pin):
+        pulse_start_ns = _mono()
+        if pulse_start_ns > deadline_ns:
+            print("✗ Timeout waiting for echo start")
+            return None
+    
+    while read_echo(_echo_pin):
+        pulse_end_ns = _mono()
+        if pulse_end_ns > deadline_ns:
+            print("✗ Timeout waiting for echo end")
+            return None
+    
+    return (pulse_end_ns - pulse_start_ns) / 1000
+
 def test_ultrasonic():
     """Test HC-SR04 Ultrasonic Sensor"""
     print("\n=== Testing HC-SR04 Ultrasonic Sensor ===")
-    print(f"Trigger Pin: {ULTRASONIC_TRIGGER}, Echo Pin: {ULTRASONIC_ECHO}")
+    print(f"Trigger Pin: {Pin.ULTRASONIC_TRIGGER}, Echo Pin: {Pin.ULTRASONIC_ECHO}")
     
     try:
-        # Setup pins
-        GPIO.setup(ULTRASONIC_TRIGGER, GPIO.OUT)
-        GPIO.setup(ULTRASONIC_ECHO, GPIO.IN)
-        
-        # Initial state
-        GPIO.output(ULTRASONIC_TRIGGER, False)
-        time.sleep(0.1)
-        
-        # Send trigger pulse
-        GPIO.output(ULTRASONIC_TRIGGER, True)
-        time.sleep(0.00001)  # 10 microseconds
-        GPIO.output(ULTRASONIC_TRIGGER, False)
-        
-        # Wait for echo
-        timeout = time.time() + 0.5  # 500ms timeout
-        while GPIO.input(ULTRASONIC_ECHO) == 0:
-            pulse_start = time.time()
-            if time.time() > timeout:
-                print("✗ Timeout waiting for echo start")
-                return False
+        with realtime_priority():
+            if ultrasonic_lib is not None:
+                pulse_us = measure_echo_native()
+            elif pi is not None:
+                pulse_us = measure_echo_pigpio()
+            else:
+                try:
+                    pulse_us = measure_echo_events()
+                except RuntimeError:
+                    # Edge detection is unavailable on some kernels
+                    print("Using polling (less accurate)")
+                    pulse_us = measure_echo_polling()
         
-        while GPIO.input(ULTRASONIC_ECHO) == 1:
-            pulse_end = time.time()
-            if time.time() > timeout:
-                print("✗ Timeout waiting for echo end")
-                return False
+        if pulse_us is None:
+            return SensorResult("ultrasonic", False)
         
-        # Calculate distance
-        pulse_duration = pulse_end - pulse_start
-        distance = (pulse_duration * 34300) / 2
+        # Calculate distance (speed of sound 343 m/s, round trip)
+        distance = pulse_us * 0.01715
         
         if 2 <= distance <= 400:
             print(f"✓ Distance: {distance:.2f} cm")
-            return True
+            return SensorResult("ultrasonic", True, reading=distance)
         else:
             print(f"✗ Distance out of range: {distance:.2f} cm")
-            return False
+            return SensorResult("ultrasonic", False, reading=distance)
             
     except Exception as e:
         print(f"✗ Ultrasonic test failed: {e}")
-        return False
+        return SensorResult("ultrasonic", False)
 
 def test_dht11():
     """Test DHT11 Temperature and Humidity Sensor"""
     print("\n=== Testing DHT11 Sensor ===")
-    print(f"Data Pin: {DHT11_DATA}")
+    print(f"Data Pin: {Pin.DHT11_DATA}")
     
     try:
-        # Try multiple times as DHT11 can be unreliable
-        for attempt in range(3):
-            print(f"Attempt {attempt + 1}/3...")
-            humidity, temperature = Adafruit_DHT.read_retry(
+        if pi is not None:
+            read = lambda: read_dht11_pigpio(Pin.DHT11_DATA)
+        else:
+            # Legacy library, only needed without pigpiod
+            import Adafruit_DHT
+            read = lambda: Adafruit_DHT.read_retry(
                 Adafruit_DHT.DHT11, 
-                DHT11_DATA, 
+                Pin.DHT11_DATA, 
                 retries=5, 
                 delay_seconds=2
             )
+        
+        # Try multiple times as DHT11 can be unreliable
+        for attempt in range(3):
+            print(f"Attempt {attempt + 1}/3...")
+            humidity, temperature = read()
             
             if humidity is not None and temperature is not None:
                 print(f"✓ Temperature: {temperature:.1f}°C")
                 print(f"✓ Humidity: {humidity:.1f}%")
-                return True
+                return SensorResult("dht11", True, reading=temperature)
             else:
                 print(f"✗ Attempt {attempt + 1} failed")
                 time.sleep(2)
         
         print("✗ DHT11 test failed after 3 attempts")
         print("Check wiring: VCC->3.3V, GND->GND, DATA->GPIO22")
-        return False
+        return SensorResult("dht11", False)
         
     except Exception as e:
         print(f"✗ DHT11 test failed: {e}")
-        return False
+        return SensorResult("dht11", False)
 
 def test_pir():
     """Test PIR Motion Sensor"""
     print("\n=== Testing PIR Motion Sensor ===")
-    print(f"Data Pin: {PIR_DATA}")
+    print(f"Data Pin: {Pin.PIR_DATA}")
     
     try:
-        GPIO.setup(PIR_DATA, GPIO.IN)
+        gpio_setup(Pin.PIR_DATA, GPIO.IN)
         
         print("PIR sensor warming up (5 seconds)...")
         time.sleep(5)
         
         print("Reading PIR for 10 seconds (try moving in front of sensor)...")
-        motion_detected = False
+        motion_times = []
         
-        for i in range(10):
-            if GPIO.input(PIR_DATA):
-                print(f"✓ Motion detected at second {i + 1}")
-                motion_detected = True
-            else:
-                print(f"- No motion at second {i + 1}")
-            time.sleep(1)
+        # Edge callbacks run on the library's interrupt thread, so short
+        # pulses between samples are no longer missed
+        polling = False
+        if pi is not None:
+            cb = pi.callback(Pin.PIR_DATA, pigpio.RISING_EDGE,
+                             lambda gpio, level, tick: motion_times.append(time.monotonic()))
+        else:
+            try:
+                with gpio_lock:
+                    GPIO.add_event_detect(Pin.PIR_DATA, GPIO.RISING, bouncetime=200,
+                                          callback=lambda channel: motion_times.append(time.monotonic()))
+            except RuntimeError:
+                # Edge detection is unavailable on some kernels
+                print("Using polling (short pulses may be missed)")
+                polling = True
+        start = time.monotonic()
+        if polling:
+            last_state = 0
+            while time.monotonic() - start < 10:
+                state = GPIO.input(Pin.PIR_DATA)
+                if state and not last_state:
+                    motion_times.append(time.monotonic())
+                last_state = state
+                time.sleep(0.05)
+        else:
+            if GPIO.input(Pin.PIR_DATA):
+                motion_times.append(start)  # Output already high when armed
+            try:
+                time.sleep(10)
+            finally:
+                if pi is not None:
+                    cb.cancel()
+                else:
+                    with gpio_lock:
+                        GPIO.remove_event_detect(Pin.PIR_DATA)
+        
+        for t in motion_times:
+            print(f"✓ Motion detected at {t - start:.2f}s")
+        motion_detected = bool(motion_times)
         
         if motion_detected:
             print("✓ PIR sensor is working")
-            return True
+            return SensorResult("pir", True, reading=len(motion_times))
         else:
             print("⚠ No motion detected - try moving in front of sensor")
-            return False
+            return SensorResult("pir", False, reading=0)
             
     except Exception as e:
         print(f"✗ PIR test failed: {e}")
-        return False
+        return SensorResult("pir", False)
 
 def test_ldr():
     """Test LDR Light Sensor"""
     print("\n=== Testing LDR Light Sensor ===")
-    print(f"LDR Pin: {LDR_PIN}")
+    print(f"LDR Pin: {Pin.LDR_PIN}")
     
     try:
         def rc_time():
+            if pi is not None:
+                return rc_charge_time_pigpio(Pin.LDR_PIN, 0.1, 2.0)
+            
             count = 0
             # Discharge capacitor
-            GPIO.setup(LDR_PIN, GPIO.OUT)
-            GPIO.output(LDR_PIN, GPIO.LOW)
-            time.sleep(0.1)
+            if fast_gpio is not None:
+                # Flip direction with GPFSEL writes instead of GPIO.setup
+                fast_gpio.set_output(Pin.LDR_PIN)
+                fast_gpio.clear(Pin.LDR_PIN)
+                time.sleep(0.1)
+                fast_gpio.set_input(Pin.LDR_PIN)
+                read_pin = fast_gpio.level
+            else:
+                gpio_setup(Pin.LDR_PIN, GPIO.OUT)
+                GPIO.output(Pin.LDR_PIN, GPIO.LOW)
+                time.sleep(0.1)
+                gpio_setup(Pin.LDR_PIN, GPIO.IN)
+                read_pin = GPIO.input
             
             # Count time to charge
-            GPIO.setup(LDR_PIN, GPIO.IN)
-            start_time = time.time()
+            deadline_ns = time.monotonic_ns() + 2_000_000_000
             
-            while GPIO.input(LDR_PIN) == GPIO.LOW:
+            while read_pin(Pin.LDR_PIN) == GPIO.LOW:
                 count += 1
-                if count > 1000000 or (time.time() - start_time) > 2:
+                if count > 1000000 or time.monotonic_ns() > deadline_ns:
                     break
             
             return count
         
         # Take multiple readings
-        readings = []
-        for i in range(3):
-            reading = rc_time()
-            readings.append(reading)
+        print(f"Charge time unit: {'microseconds' if pi is not None else 'loop counts'}")
+        readings = array('Q', [0, 0, 0])
+        for i in range(len(readings)):
+            with realtime_priority():
+                reading = rc_time()
+            readings[i] = reading
             print(f"Reading {i + 1}: {reading}")
             time.sleep(0.5)
         
-        avg_reading = sum(readings) / len(readings)
+        avg_reading = fmean(readings)
         print(f"✓ Average LDR reading: {avg_reading:.0f}")
         print("Try covering/uncovering the LDR to see changes")
-        return True
+        return SensorResult("ldr", True, reading=avg_reading)
         
     except Exception as e:
         print(f"✗ LDR test failed: {e}")
-        return False
+        return SensorResult("ldr", False)
 
 def test_mq135():
     """Test MQ-135 Air Quality Sensor"""
     print("\n=== Testing MQ-135 Air Quality Sensor ===")
-    print(f"Digital Pin: {MQ135_DIGITAL}, Analog Pin: {MQ135_ANALOG}")
+    print(f"Digital Pin: {Pin.MQ135_DIGITAL}, Analog Pin: {Pin.MQ135_ANALOG}")
     
     try:
         # Test digital pin
-        GPIO.setup(MQ135_DIGITAL, GPIO.IN)
-        digital_value = GPIO.input(MQ135_DIGITAL)
+        gpio_setup(Pin.MQ135_DIGITAL, GPIO.IN)
+        digital_value = GPIO.input(Pin.MQ135_DIGITAL)
         print(f"Digital reading: {digital_value} ({'Gas detected' if not digital_value else 'No gas'})")
         
         # Test analog using RC method
         def read_analog():
+            if pi is not None:
+                return rc_charge_time_pigpio(Pin.MQ135_ANALOG, 0.01, 1.0)
+            
             count = 0
-            GPIO.setup(MQ135_ANALOG, GPIO.OUT)
-            GPIO.output(MQ135_ANALOG, GPIO.LOW)
-            time.sleep(0.01)
+            if fast_gpio is not None:
+                # Flip direction with GPFSEL writes instead of GPIO.setup
+                fast_gpio.set_output(Pin.MQ135_ANALOG)
+                fast_gpio.clear(Pin.MQ135_ANALOG)
+                time.sleep(0.01)
+                fast_gpio.set_input(Pin.MQ135_ANALOG)
+                read_pin = fast_gpio.level
+            else:
+                gpio_setup(Pin.MQ135_ANALOG, GPIO.OUT)
+                GPIO.output(Pin.MQ135_ANALOG, GPIO.LOW)
+                time.sleep(0.01)
+                gpio_setup(Pin.MQ135_ANALOG, GPIO.IN)
+                read_pin = GPIO.input
             
-            GPIO.setup(MQ135_ANALOG, GPIO.IN)
-            start_time = time.time()
+            deadline_ns = time.monotonic_ns() + 1_000_000_000
             
-            while GPIO.input(MQ135_ANALOG) == GPIO.LOW:
+            while read_pin(Pin.MQ135_ANALOG) == GPIO.LOW:
                 count += 1
-                if count > 100000 or (time.time() - start_time) > 1:
+                if count > 100000 or time.monotonic_ns() > deadline_ns:
                     break
             
             return count
         
-        analog_reading = read_analog()
+        with realtime_priority():
+            analog_reading = read_analog()
         print(f"✓ Analog reading: {analog_reading}")
         print("Note: MQ-135 needs warm-up time (24-48 hours for accurate readings)")
-        return True
+        return SensorResult("mq135", True, reading=analog_reading)
         
     except Exception as e:
         print(f"✗ MQ-135 test failed: {e}")
-        return False
+        return SensorResult("mq135", False)
+
+def read_first(paths):
+    """Return the contents of the first readable file in paths, or None"""
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except OSError:
+            continue
+    return None
 
 def check_pin_conflicts():
     """Check for pin conflicts and system issues"""
     print("\n=== Checking System Status ===")
     
-    # Check if SPI/I2C might be interfering
-    try:
-        with open('/boot/config.txt', 'r') as f:
-            config = f.read()
-            if 'dtparam=spi=on' in config:
-                print("⚠ SPI is enabled - might conflict with some GPIO pins")
-            if 'dtparam=i2c_arm=on' in config:
-                print("⚠ I2C is enabled - might conflict with some GPIO pins")
-    except:
-        pass
+    # Check if SPI/I2C might be interfering (Bookworm moved config.txt)
+    config = read_first(('/boot/firmware/config.txt', '/boot/config.txt'))
+    if config:
+        if 'dtparam=spi=on' in config:
+            print("⚠ SPI is enabled - might conflict with some GPIO pins")
+        if 'dtparam=i2c_arm=on' in config:
+            print("⚠ I2C is enabled - might conflict with some GPIO pins")
     
-    # Check GPIO pin status
+    # Check GPIO pin status without reconfiguring any pins
     print("\nGPIO Pin Usage:")
-    pins_to_check = [ULTRASONIC_TRIGGER, ULTRASONIC_ECHO, MQ135_DIGITAL, 
-                     MQ135_ANALOG, DHT11_DATA, LDR_PIN, PIR_DATA]
+    pins_to_check = list(Pin)
+    
+    # One read of the kernel's GPIO table covers every pin (needs root)
+    dump = read_first(('/sys/kernel/debug/gpio',))
+    functions = {GPIO.IN: 'Input', GPIO.OUT: 'Output', GPIO.SPI: 'SPI',
+                 GPIO.I2C: 'I2C', GPIO.HARD_PWM: 'PWM', GPIO.SERIAL: 'Serial'}
     
     for pin in pins_to_check:
         try:
-            GPIO.setup(pin, GPIO.IN)
-            print(f"GPIO {pin}: Available")
+            if dump:
+                # Kernels from 6.6 number the header GPIOs from 512
+                match = re.search(rf'^\s*gpio-(?:{pin}|{pin + 512})\s+(.*)$', dump, re.MULTILINE)
+                print(f"GPIO {pin}: {match.group(1).strip() if match else 'Not claimed'}")
+            else:
+                print(f"GPIO {pin}: {functions.get(GPIO.gpio_function(pin), 'Unknown')}")
         except Exception as e:
             print(f"GPIO {pin}: Error - {e}")
 
@@ -271,16 +739,37 @@ def main():
     if not setup_gpio():
         return
     
+    # Keep all sampling on the isolated core, away from tick/IPI jitter
+    if (os.cpu_count() or 1) > SENSOR_CPU:
+        try:
+            os.sched_setaffinity(0, {SENSOR_CPU})
+            print(f"✓ Pinned to CPU {SENSOR_CPU}")
+        except OSError as e:
+            print(f"⚠ Could not pin to CPU {SENSOR_CPU}: {e}")
+    
+    # Timing tests are steadier at a fixed clock and real-time priority
+    saved_governors = set_cpu_governor("performance")
+    if os.geteuid() != 0:
+        print("⚠ Not running as root - timing tests run without real-time priority")
+    
     # Test each sensor
-    results = {}
+    results: list[SensorResult] = []
     
     try:
-        # Run tests
-        results['ultrasonic'] = test_ultrasonic()
-        results['dht11'] = test_dht11()
-        results['pir'] = test_pir()
-        results['ldr'] = test_ldr()
-        results['mq135'] = test_mq135()
+        # Ultrasonic runs alone so its real-time timing has the core to itself
+        results.append(timed(test_ultrasonic))
+        
+        # DHT11 and PIR use disjoint pins and mostly wait on the hardware,
+        # so run them side by side
+        print("\nRunning DHT11 and PIR tests in parallel...")
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            futures = [ex.submit(timed, fn) for fn in (test_dht11, test_pir)]
+        results.extend(f.result() for f in futures)
+        
+        # LDR and MQ-135 busy-wait at real-time priority on the pinned core,
+        # which would starve any other thread sharing it, so run them alone
+        results.append(timed(test_ldr))
+        results.append(timed(test_mq135))
         
         # System checks
         check_pin_conflicts()
@@ -290,11 +779,11 @@ def main():
         print("SUMMARY")
         print("="*50)
         
-        for sensor, status in results.items():
-            status_str = "✓ PASS" if status else "✗ FAIL"
-            print(f"{sensor.upper():12}: {status_str}")
+        for r in results:
+            status_str = "✓ PASS" if r.ok else "✗ FAIL"
+            print(f"{r.name.upper():12}: {status_str}  ({r.duration_ms / 1000:.1f}s)")
         
-        passed = sum(results.values())
+        passed = sum(r.ok for r in results)
         total = len(results)
         print(f"\nPassed: {passed}/{total} sensors")
         
@@ -314,6 +803,11 @@ def main():
     except Exception as e:
         print(f"\n\nUnexpected error: {e}")
     finally:
+        restore_cpu_governor(saved_governors)
+        if pi is not None:
+            pi.stop()
+        if fast_gpio is not None:
+            fast_gpio.close()
         GPIO.cleanup()
         print("GPIO cleanup completed")
 
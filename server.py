@@ -3,21 +3,32 @@
 Multi-Sensor API Server for Raspberry Pi
 Supports Ultrasonic (HC-SR04), MQ-135 Air Quality, DHT11 Temperature/Humidity,
 LDR Light Sensor, and PIR Motion Sensor
-Direct GPIO connections without MCP3008
+Direct GPIO connections, with optional MCP3008 (SPI) for the analog outputs
 Exposes sensor data via FastAPI REST API
 """
 
+import os
 import time
-import json
+import math
+import ctypes
+import asyncio
+import heapq
+from abc import ABC, abstractmethod
+import hashlib
+from collections import deque
+import itertools
+from operator import itemgetter
+import orjson
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
-from threading import Thread, Lock
+from threading import Lock, Event
 import logging
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import ORJSONResponse
 
 # Uncomment these imports when running on Raspberry Pi
 try:
@@ -29,63 +40,227 @@ except ImportError:
     SIMULATION_MODE = True
     print("WARNING: Running in simulation mode - install RPi.GPIO and Adafruit_DHT")
 
+if not SIMULATION_MODE:
+    GPIO.setmode(GPIO.BCM)  # every pin number below is BCM
+
+# Optional CircuitPython DHT driver; times the DHT11 pulses through libgpiod_pulsein
+# instead of busy-looping like Adafruit_DHT
+try:
+    import adafruit_dht
+    import board
+except (ImportError, NotImplementedError):
+    adafruit_dht = None
+
+# Optional MCP3008 ADC for the MQ-135 and LDR analog outputs
+try:
+    import spidev
+except ImportError:
+    spidev = None
+
+# Optional pigpio daemon client; pigpiod timestamps GPIO edges to a few microseconds
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Data Models
-class SensorReading(BaseModel):
-    AlertType: str
-    assetId: str
-    Description: str
-    Date: str
-    Report: str
-    App: str
-    anchor: str
-    Stage_x007b__x0023__x007d_: str
-    Failure_x0020_Class: str
-    id: str
-    Priority: str
-    OperatorNumber: str
-    OperatorName: str
-    ManagerName: str
-    ManagerNumber: str
-    GoogleDriveURL: str
-
-class ApiResponse(BaseModel):
-    data: List[Dict]
-    shouldSubscribe: str
-
-class BaseSensor:
+def _spin_ns(ns: int):
+    """Busy-wait for ns nanoseconds; time.sleep overshoots sub-tick delays"""
+    t0 = time.perf_counter_ns()
+    while time.perf_counter_ns() - t0 < ns:
+        pass
+
+def connect_pigpio():
+    """Connect to the local pigpiod, or return None to use RPi.GPIO timing"""
+    if SIMULATION_MODE or pigpio is None:
+        return None
+    conn = pigpio.pi()
+    if not conn.connected:
+        logger.warning("pigpiod not running - start it with 'sudo systemctl enable --now pigpiod'")
+        return None
+    return conn
+
+pi = connect_pigpio()
+
+MCL_CURRENT = 1
+
+def lock_memory():
+    """Lock the process's pages in RAM so page faults can't stall timing loops"""
+    try:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        if libc.mlockall(MCL_CURRENT) != 0:
+            logger.warning("mlockall failed: %s (needs CAP_IPC_LOCK)", os.strerror(ctypes.get_errno()))
+    except OSError as e:
+        logger.warning("mlockall unavailable: %s", e)
+
+@contextmanager
+def realtime_priority(priority: int = 80):
+    """Run the calling thread under SCHED_FIFO; a no-op without CAP_SYS_NICE"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        boosted = True
+    except (AttributeError, OSError):
+        boosted = False
+    try:
+        yield
+    finally:
+        if boosted:
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+
+# MCP3008 on SPI0 CE0, opened on first use
+spi = None
+spi_lock = Lock()
+
+def read_adc(channel: int) -> int:
+    """Read a 10-bit value from an MCP3008 channel"""
+    global spi
+    with spi_lock:
+        if spi is None:
+            spi = spidev.SpiDev()
+            spi.open(0, 0)
+            spi.max_speed_hz = 1_350_000
+        r = spi.xfer2([1, (8 + channel) << 4, 0])
+    return ((r[1] & 3) << 8) | r[2]
+
+# Microseconds one pass of the RPi.GPIO charge-timing loop takes (calibrate on your Pi).
+# pigpiod charge times are divided by this so both paths report the same loop-count
+# scale, which the ppm/percentage conversions and alert thresholds are tuned for
+RC_LOOP_US = 1.5
+
+def rc_charge_us(pin: int, discharge_s: float, timeout_s: float) -> int:
+    """Time an RC circuit charging to HIGH with pigpiod edge ticks, in microseconds
+    
+    Sleeps instead of spinning on GPIO reads; a timeout returns the full timeout.
+    """
+    charged = Event()
+    ticks = []
+    
+    def on_rise(gpio, level, tick):
+        if level == 1 and not ticks:
+            ticks.append(tick)
+            charged.set()
+    
+    pi.set_mode(pin, pigpio.OUTPUT)
+    pi.write(pin, 0)
+    time.sleep(discharge_s)
+    cb = pi.callback(pin, pigpio.RISING_EDGE, on_rise)
+    try:
+        start = pi.get_current_tick()
+        pi.set_mode(pin, pigpio.INPUT)
+        if not charged.wait(timeout_s):
+            return int(timeout_s * 1_000_000)
+        return pigpio.tickDiff(start, ticks[0])
+    finally:
+        cb.cancel()
+
+# Fixed alert fields; generate_alert fills in the None ones (keeps key order)
+_ALERT_TEMPLATE = {
+    "AlertType": None,
+    "assetId": "MCN-02",
+    "Description": None,
+    "Date": None,
+    "Report": "NaN",
+    "App": "IoT Sensor System",
+    "anchor": None,
+    "Stage_x007b__x0023__x007d_": "NaN",
+    "Failure_x0020_Class": None,
+    "id": None,
+    "Priority": "NaN",
+    "OperatorNumber": "NaN",
+    "OperatorName": "NaN",
+    "ManagerName": "NaN",
+    "ManagerNumber": "NaN",
+    "GoogleDriveURL": "NaN"
+}
+
+class BaseSensor(ABC):
+    period = 1.0  # seconds between background reads
+    polled = True  # False when the sensor reports changes by itself
+    time_varying = False  # True when get_reading changes between reads, so it can't be byte-cached
+    alert_persistence = 3  # consecutive reads in a new alert class before it counts
+    alert_cooldown = 60.0  # seconds before the same alert class can fire again
+    
     def __init__(self, sensor_id: str, asset_id: str):
         self.sensor_id = sensor_id
         self.asset_id = asset_id
         self.last_reading_time = None
         self.lock = Lock()
-        self.alerts = []
+        self.alerts = deque(maxlen=100)  # oldest alerts drop off
+        self._snapshot = None
+        self._alert_state = {}  # confirmed alert class per measured quantity
+        self._alert_pending = {}  # key -> (candidate class, consecutive reads)
+        self._alert_fired = {}  # alert class -> monotonic time it last fired
+        self.alock = None  # asyncio.Lock serializing hardware reads, made at startup
+        # Unique alert ids; seeded from the start time in ms so restarts don't reuse them
+        self._alert_seq = itertools.count(int(time.time() * 1000))
         
-    def generate_alert(self, alert_type: str, description: str, failure_class: str = "NaN") -> Dict:
-        alert_id = f"{self.sensor_id}_{int(time.time())}"
-        return {
-            "AlertType": alert_type,
-            "assetId": "MCN-02",
-            "Description": description,
-            "Date": datetime.now(timezone.utc).isoformat(),
-            "Report": "NaN",
-            "App": "IoT Sensor System",
-            "anchor": self.asset_id,
-            "Stage_x007b__x0023__x007d_": "NaN",
-            "Failure_x0020_Class": failure_class,
-            "id": alert_id,
-            "Priority": "NaN",
-            "OperatorNumber": "NaN",
-            "OperatorName": "NaN",
-            "ManagerName": "NaN",
-            "ManagerNumber": "NaN",
-            "GoogleDriveURL": "NaN"
-        }
+    @abstractmethod
+    def build_reading(self) -> Dict:
+        """Build the current reading dict for this sensor"""
+    
+    def publish(self):
+        """Swap in a fresh reading; called by the writer while holding self.lock"""
+        self._snapshot = self.build_reading()
+    
+    def get_reading(self) -> Dict:
+        """Latest published reading, without locking (treat as read-only)"""
+        return self._snapshot
+        
+    def in_alert(self, key: str, failure_class: str, enter: bool, stay: bool) -> bool:
+        """Hysteresis: `enter` starts failure_class, `stay` keeps it once it's active"""
+        return stay if self._alert_state.get(key) == failure_class else enter
+    
+    def raise_on_change(self, key: str, alert_type: str = None, description: str = None,
+                        failure_class: str = None):
+        """Append an alert when `key` settles in a new alert class; no class clears it
+        
+        The new class must hold for alert_persistence consecutive reads, and a
+        class that fired within alert_cooldown seconds stays quiet.
+        """
+        if self._alert_state.get(key) == failure_class:
+            self._alert_pending.pop(key, None)
+            return
+        candidate, count = self._alert_pending.get(key, (None, 0))
+        count = count + 1 if candidate == failure_class else 1
+        if count < self.alert_persistence:
+            self._alert_pending[key] = (failure_class, count)
+            return
+        
+        self._alert_pending.pop(key, None)
+        self._alert_state[key] = failure_class
+        if failure_class is None:
+            return
+        now = time.monotonic()
+        if now - self._alert_fired.get(failure_class, float('-inf')) < self.alert_cooldown:
+            return
+        self._alert_fired[failure_class] = now
+        self.alerts.append(self.generate_alert(alert_type, description, failure_class,
+                                               date=self.last_reading_time))
+    
+    def stamp(self, now: Optional[datetime] = None):
+        """Set the reading time shared by the reading and its alerts"""
+        self.last_reading_time = now or datetime.now(timezone.utc)
+        
+    def generate_alert(self, alert_type: str, description: str, failure_class: str = "NaN",
+                       date: Optional[datetime] = None) -> Dict:
+        alert = _ALERT_TEMPLATE.copy()
+        alert.update(
+            AlertType=alert_type,
+            Description=description,
+            Date=date or datetime.now(timezone.utc),
+            anchor=self.asset_id,
+            Failure_x0020_Class=failure_class,
+            id=f"{self.sensor_id}_{next(self._alert_seq)}"
+        )
+        return alert
 
 class UltrasonicSensor(BaseSensor):
+    period = 0.06  # HC-SR04 needs ~60ms between pings for echoes to die out
+    polling_period = 1.0  # the polling fallback spins at SCHED_FIFO, so run it rarely
+    
     def __init__(self, sensor_id: str = "ULTRASONIC-01", asset_id: str = "DIST-SENSOR-01", 
                  trigger_pin: int = 18, echo_pin: int = 24):
         super().__init__(sensor_id, asset_id)
@@ -95,70 +270,185 @@ class UltrasonicSensor(BaseSensor):
         self.min_distance_threshold = 10.0  # cm
         self.max_distance_threshold = 200.0  # cm
         
+        # Echo edge timestamps, filled in by the pigpio or edge-detect callback
+        self.pigpio_cb = None
+        self.edge_detect = False
+        self._rising = Event()
+        self._falling = Event()
+        self._t_rise = 0
+        self._t_fall = 0
+        
         # Initialize GPIO pins
         self.setup_pins()
+        self.publish()
         
     def setup_pins(self):
         """Setup GPIO pins for ultrasonic sensor"""
+        if pi is not None:
+            try:
+                pi.set_mode(self.trigger_pin, pigpio.OUTPUT)
+                pi.set_mode(self.echo_pin, pigpio.INPUT)
+                pi.write(self.trigger_pin, 0)
+                self.pigpio_cb = pi.callback(self.echo_pin, pigpio.EITHER_EDGE, self._on_pigpio_edge)
+                time.sleep(0.1)  # Let sensor settle
+                return
+            except Exception as e:
+                logger.error("Error setting up ultrasonic pins with pigpio: %s", e)
+        
         if not SIMULATION_MODE:
             try:
-                GPIO.setmode(GPIO.BCM)
                 GPIO.setup(self.trigger_pin, GPIO.OUT)
                 GPIO.setup(self.echo_pin, GPIO.IN)
                 GPIO.output(self.trigger_pin, False)
                 time.sleep(0.1)  # Let sensor settle
             except Exception as e:
-                logger.error(f"Error setting up ultrasonic pins: {e}")
-        
+                logger.error("Error setting up ultrasonic pins: %s", e)
+                return
+            
+            # Let the kernel wake us on echo edges instead of busy-polling
+            try:
+                GPIO.add_event_detect(self.echo_pin, GPIO.BOTH, callback=self._on_echo_edge)
+                self.edge_detect = True
+            except RuntimeError as e:
+                logger.warning("Echo edge detection unavailable, falling back to polling: %s", e)
+                self.period = self.polling_period
+    
+    def _on_echo_edge(self, channel):
+        """Record echo edge times; the first edge after a trigger is the rising one"""
+        now = time.perf_counter_ns()
+        if not self._rising.is_set():
+            self._t_rise = now
+            self._rising.set()
+        elif not self._falling.is_set():
+            self._t_fall = now
+            self._falling.set()
+    
+    def _on_pigpio_edge(self, gpio, level, tick):
+        """Record pigpiod's tick for each echo edge"""
+        if level == 1:
+            self._t_rise = tick
+            self._rising.set()
+        elif level == 0 and self._rising.is_set():
+            self._t_fall = tick
+            self._falling.set()
+    
     def measure_distance(self) -> Optional[float]:
         """Measure distance using ultrasonic sensor (HC-SR04)"""
+        if self.pigpio_cb is not None:
+            return self.measure_distance_pigpio()
+        
         if SIMULATION_MODE:
             return None  # Return None instead of random values
-            
+        
+        # Preemption mid-pulse skews the echo timing, so measure at real-time priority
+        with realtime_priority():
+            if self.edge_detect:
+                return self.measure_distance_edges()
+            return self.measure_distance_polling()
+    
+    def measure_distance_polling(self) -> Optional[float]:
+        """Measure distance by polling the echo pin"""
         try:
-            # Ensure pins are set correctly
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.trigger_pin, GPIO.OUT)
-            GPIO.setup(self.echo_pin, GPIO.IN)
-            
             # Clear trigger
             GPIO.output(self.trigger_pin, False)
-            time.sleep(0.000002)  # 2 microseconds
+            _spin_ns(2_000)  # 2 microseconds
             
             # Send 10us pulse to trigger
             GPIO.output(self.trigger_pin, True)
-            time.sleep(0.00001)  # 10 microseconds
+            _spin_ns(10_000)  # 10 microseconds
             GPIO.output(self.trigger_pin, False)
             
+            # Local names keep global/attribute lookups out of the spin loops
+            gpio_input = GPIO.input
+            now = time.perf_counter_ns
+            echo_pin = self.echo_pin
+            
             # Wait for echo to start
-            timeout_start = time.time()
-            while GPIO.input(self.echo_pin) == 0:
-                pulse_start = time.time()
-                if pulse_start - timeout_start > 0.1:  # 100ms timeout
+            pulse_start = now()
+            deadline = pulse_start + 100_000_000  # 100ms timeout
+            while gpio_input(echo_pin) == 0:
+                pulse_start = now()
+                if pulse_start > deadline:
                     logger.warning("Ultrasonic timeout waiting for echo start")
                     return None
             
             # Wait for echo to stop
-            timeout_end = time.time()
-            while GPIO.input(self.echo_pin) == 1:
-                pulse_end = time.time()
-                if pulse_end - timeout_end > 0.1:  # 100ms timeout
+            pulse_end = pulse_start
+            deadline = pulse_start + 100_000_000  # 100ms timeout
+            while gpio_input(echo_pin) == 1:
+                pulse_end = now()
+                if pulse_end > deadline:
                     logger.warning("Ultrasonic timeout waiting for echo end")
                     return None
             
-            # Calculate distance
-            pulse_duration = pulse_end - pulse_start
-            distance = (pulse_duration * 34300) / 2
+            # Calculate distance (343 m/s in cm/ns, halved for the round trip)
+            pulse_duration_ns = pulse_end - pulse_start
+            distance = pulse_duration_ns * 1.715e-5
+            
+            # Validate HC-SR04 range (2cm to 400cm)
+            if 2 <= distance <= 400:
+                return round(distance, 2)
+            else:
+                logger.warning("Distance out of range: %scm", distance)
+                return None
+                
+        except Exception as e:
+            logger.error("Ultrasonic sensor error: %s", e)
+            return None
+    
+    def measure_distance_pigpio(self) -> Optional[float]:
+        """Measure distance from pigpiod edge ticks (microsecond timestamps)"""
+        try:
+            self._rising.clear()
+            self._falling.clear()
+            pi.gpio_trigger(self.trigger_pin, 10, 1)  # 10us pulse timed by the daemon
+            
+            if not self._falling.wait(timeout=0.1):
+                logger.warning("Ultrasonic timeout waiting for echo")
+                return None
+            
+            # Speed of sound 343 m/s in cm/us, halved for the round trip
+            distance = pigpio.tickDiff(self._t_rise, self._t_fall) * 0.01715
+            
+            # Validate HC-SR04 range (2cm to 400cm)
+            if 2 <= distance <= 400:
+                return round(distance, 2)
+            else:
+                logger.warning("Distance out of range: %scm", distance)
+                return None
+                
+        except Exception as e:
+            logger.error("Ultrasonic sensor error: %s", e)
+            return None
+    
+    def measure_distance_edges(self) -> Optional[float]:
+        """Measure distance from echo edges delivered by GPIO.add_event_detect"""
+        try:
+            self._rising.clear()
+            self._falling.clear()
+            
+            # Send 10us pulse to trigger
+            GPIO.output(self.trigger_pin, True)
+            _spin_ns(10_000)  # 10 microseconds
+            GPIO.output(self.trigger_pin, False)
+            
+            # Sleep until the falling edge arrives (100ms timeout)
+            if not self._falling.wait(timeout=0.1):
+                logger.warning("Ultrasonic timeout waiting for echo")
+                return None
+            
+            # Speed of sound 343 m/s, halved for the round trip
+            distance = (self._t_fall - self._t_rise) * 1.715e-5
             
             # Validate HC-SR04 range (2cm to 400cm)
             if 2 <= distance <= 400:
                 return round(distance, 2)
             else:
-                logger.warning(f"Distance out of range: {distance}cm")
+                logger.warning("Distance out of range: %scm", distance)
                 return None
                 
         except Exception as e:
-            logger.error(f"Ultrasonic sensor error: {e}")
+            logger.error("Ultrasonic sensor error: %s", e)
             return None
 
             
@@ -168,58 +458,71 @@ class UltrasonicSensor(BaseSensor):
         if distance is not None:
             with self.lock:
                 self.distance = distance
-                self.last_reading_time = datetime.now(timezone.utc)
+                self.stamp()
                 
                 if distance < self.min_distance_threshold:
-                    alert = self.generate_alert(
+                    self.raise_on_change(
+                        'distance',
                         "Proximity Alert",
                         f"Object detected within {self.min_distance_threshold}cm. Current distance: {distance}cm",
                         "Proximity_Warning"
                     )
-                    self.alerts.append(alert)
                 elif distance > self.max_distance_threshold:
-                    alert = self.generate_alert(
+                    self.raise_on_change(
+                        'distance',
                         "Range Alert",
                         f"No object detected within range. Current distance: {distance}cm",
                         "Range_Warning"
                     )
-                    self.alerts.append(alert)
+                else:
+                    self.raise_on_change('distance')
+                
+                self.publish()
                     
-    def get_reading(self) -> Dict:
-        """Get the current distance reading"""
-        with self.lock:
-            return {
-                'sensor_type': 'ultrasonic',
-                'sensor_id': self.sensor_id,
-                'distance_cm': self.distance,
-                'distance_inches': round(self.distance / 2.54, 2),
-                'timestamp': self.last_reading_time.isoformat() if self.last_reading_time else None,
-                'status': 'active' if self.last_reading_time else 'no_reading',
-                'pins': {'trigger': self.trigger_pin, 'echo': self.echo_pin}
-            }
+    def build_reading(self) -> Dict:
+        """Build the current distance reading"""
+        return {
+            'sensor_type': 'ultrasonic',
+            'sensor_id': self.sensor_id,
+            'distance_cm': self.distance,
+            'distance_inches': round(self.distance / 2.54, 2),
+            'timestamp': self.last_reading_time,
+            'status': 'active' if self.last_reading_time else 'no_reading',
+            'pins': {'trigger': self.trigger_pin, 'echo': self.echo_pin}
+        }
 
 class MQ135Sensor(BaseSensor):
+    period = 0.1
+    rc_period = 2.0  # the Python RC loop spins for up to 1s; keep it under half of each period
+    
     def __init__(self, sensor_id: str = "MQ135-01", asset_id: str = "AIR-QUALITY-01", 
-                 digital_pin: int = 25, analog_pin: int = 26):
+                 digital_pin: int = 25, analog_pin: int = 26, adc_channel: Optional[int] = None):
         super().__init__(sensor_id, asset_id)
         self.digital_pin = digital_pin  # Digital output pin
         self.analog_pin = analog_pin    # Using capacitor discharge method for analog
+        self.adc_channel = adc_channel  # MCP3008 channel for AO, replaces the RC method
+        self.load_resistance = 10.0     # kOhm, RL on the MQ-135 module
+        self.r0 = 76.63                 # kOhm, sensor resistance in clean air (calibrate)
         self.air_quality_ppm = 0.0
         self.gas_detected = False
         self.danger_threshold = 1000  # ppm
         self.warning_threshold = 500  # ppm
+        self.danger_exit = 900   # ppm, alert clears below this
+        self.warning_exit = 450  # ppm
+        if self.adc_channel is None and pi is None:
+            self.period = self.rc_period
         
         self.setup_pins()
+        self.publish()
         
     def setup_pins(self):
         """Setup GPIO pins for MQ-135 sensor"""
         if not SIMULATION_MODE:
             try:
-                GPIO.setmode(GPIO.BCM)
                 GPIO.setup(self.digital_pin, GPIO.IN)
                 # analog_pin will be configured dynamically in read_analog_value
             except Exception as e:
-                logger.error(f"Error setting up MQ-135 pins: {e}")
+                logger.error("Error setting up MQ-135 pins: %s", e)
         
     def read_air_quality(self) -> Optional[tuple]:
         """Read air quality from MQ-135 sensor"""
@@ -227,25 +530,31 @@ class MQ135Sensor(BaseSensor):
             return None, None  # Return None instead of random values
             
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.digital_pin, GPIO.IN)
-            
             # Read digital pin
             gas_detected = not GPIO.input(self.digital_pin)  # Usually LOW when gas detected
             
+            if self.adc_channel is not None:
+                return gas_detected, round(self.adc_to_ppm(read_adc(self.adc_channel)), 2)
+            
             # Read analog using RC circuit method
             def read_analog():
+                if pi is not None:
+                    # Converted onto the loop-count scale the conversion below expects
+                    return min(round(rc_charge_us(self.analog_pin, 0.01, 1.0) / RC_LOOP_US), 100000)
+                
                 count = 0
                 GPIO.setup(self.analog_pin, GPIO.OUT)
                 GPIO.output(self.analog_pin, GPIO.LOW)
                 time.sleep(0.01)  # Discharge
                 
                 GPIO.setup(self.analog_pin, GPIO.IN)
-                start_time = time.time()
+                # Locals keep lookups out of the loop so the count tracks charge time
+                gpio_input, now, pin, low = GPIO.input, time.perf_counter_ns, self.analog_pin, GPIO.LOW
+                deadline = now() + 1_000_000_000  # 1s timeout
                 
-                while GPIO.input(self.analog_pin) == GPIO.LOW:
+                while gpio_input(pin) == low:
                     count += 1
-                    if count > 100000 or (time.time() - start_time) > 1:
+                    if count > 100000 or now() > deadline:
                         break
                 
                 return count
@@ -263,10 +572,20 @@ class MQ135Sensor(BaseSensor):
             return gas_detected, round(ppm, 2)
 
         except Exception as e:
-            logger.error(f"MQ135 sensor error: {e}")
+            logger.error("MQ135 sensor error: %s", e)
             return None, None
 
 
+    def adc_to_ppm(self, raw: int) -> float:
+        """Convert an MCP3008 reading to PPM with the MQ-135 Rs/R0 curve"""
+        if raw <= 0:
+            return 0
+        if raw >= 1023:
+            return 2000
+        rs = self.load_resistance * (1023 - raw) / raw
+        ppm = 116.6020682 * math.pow(rs / self.r0, -2.769034857)
+        return min(ppm, 2000)  # Cap at reasonable max
+
     def update_reading(self):
         """Update air quality reading and check for alerts"""
         result = self.read_air_quality()
@@ -276,44 +595,55 @@ class MQ135Sensor(BaseSensor):
                 with self.lock:
                     self.gas_detected = gas_detected
                     self.air_quality_ppm = ppm
-                    self.last_reading_time = datetime.now(timezone.utc)
+                    self.stamp()
                     
-                    if ppm > self.danger_threshold:
-                        alert = self.generate_alert(
+                    if self.in_alert('air_quality', 'Air_Quality_Critical',
+                                     ppm > self.danger_threshold, ppm > self.danger_exit):
+                        self.raise_on_change(
+                            'air_quality',
                             "Air Quality Critical",
                             f"Dangerous air quality detected: {ppm} PPM. Immediate action required.",
                             "Air_Quality_Critical"
                         )
-                        self.alerts.append(alert)
-                    elif ppm > self.warning_threshold:
-                        alert = self.generate_alert(
+                    elif self.in_alert('air_quality', 'Air_Quality_Warning',
+                                       ppm > self.warning_threshold, ppm > self.warning_exit):
+                        self.raise_on_change(
+                            'air_quality',
                             "Air Quality Warning",
                             f"Poor air quality detected: {ppm} PPM. Monitor closely.",
                             "Air_Quality_Warning"
                         )
-                        self.alerts.append(alert)
+                    else:
+                        self.raise_on_change('air_quality')
                     
-    def get_reading(self) -> Dict:
-        """Get current air quality reading"""
-        with self.lock:
-            quality_level = "Good"
-            if self.air_quality_ppm > self.danger_threshold:
-                quality_level = "Dangerous"
-            elif self.air_quality_ppm > self.warning_threshold:
-                quality_level = "Poor"
+                    self.publish()
+                    
+    def build_reading(self) -> Dict:
+        """Build current air quality reading"""
+        quality_level = "Good"
+        if self.air_quality_ppm > self.danger_threshold:
+            quality_level = "Dangerous"
+        elif self.air_quality_ppm > self.warning_threshold:
+            quality_level = "Poor"
                 
-            return {
-                'sensor_type': 'air_quality',
-                'sensor_id': self.sensor_id,
-                'air_quality_ppm': self.air_quality_ppm,
-                'gas_detected': self.gas_detected,
-                'quality_level': quality_level,
-                'timestamp': self.last_reading_time.isoformat() if self.last_reading_time else None,
-                'status': 'active' if self.last_reading_time else 'no_reading',
-                'pins': {'digital': self.digital_pin, 'analog': self.analog_pin}
-            }
+        return {
+            'sensor_type': 'air_quality',
+            'sensor_id': self.sensor_id,
+            'air_quality_ppm': self.air_quality_ppm,
+            'gas_detected': self.gas_detected,
+            'quality_level': quality_level,
+            'timestamp': self.last_reading_time,
+            'status': 'active' if self.last_reading_time else 'no_reading',
+            'pins': {'digital': self.digital_pin, 'analog': self.analog_pin}
+        }
 
 class DHT11Sensor(BaseSensor):
+    period = 2.0  # DHT11 allows at most 1 read per second
+    # adafruit_dht only measures again once more than 2s have passed and otherwise
+    # hands back its previous values, so stay clear of that window
+    dht_min_interval = 2.0
+    dht_period = 2.5
+    
     def __init__(self, sensor_id: str = "DHT11-01", asset_id: str = "TEMP-HUM-01", 
                  data_pin: int = 22):
         super().__init__(sensor_id, asset_id)
@@ -324,6 +654,20 @@ class DHT11Sensor(BaseSensor):
         self.temp_low_threshold = 5.0    # Celsius
         self.humidity_high_threshold = 80.0  # %
         self.humidity_low_threshold = 20.0   # %
+        # Alerts clear only once readings move back past these
+        self.temp_high_exit = 33.0
+        self.temp_low_exit = 7.0
+        self.humidity_high_exit = 75.0
+        self.humidity_low_exit = 25.0
+        self.dht = None
+        self._dht_last_read = float('-inf')  # monotonic time of the last adafruit_dht read
+        if adafruit_dht is not None and not SIMULATION_MODE:
+            try:
+                self.dht = adafruit_dht.DHT11(getattr(board, f"D{data_pin}"), use_pulseio=True)
+                self.period = self.dht_period
+            except Exception as e:
+                logger.warning("adafruit_dht unavailable, using Adafruit_DHT: %s", e)
+        self.publish()
         
     def read_temp_humidity(self) -> tuple:
         """Read temperature and humidity from DHT11"""
@@ -331,103 +675,129 @@ class DHT11Sensor(BaseSensor):
             return None, None  # Return None instead of random values
             
         try:
-            # Use proper DHT11 reading with retries
-            humidity, temperature = Adafruit_DHT.read_retry(
-                Adafruit_DHT.DHT11, 
-                self.data_pin, 
-                retries=5, 
-                delay_seconds=1
-            )
+            # Single attempt; the background loop retries on its own cadence
+            if self.dht is not None:
+                if time.monotonic() - self._dht_last_read <= self.dht_min_interval:
+                    return None, None  # the driver would repeat its last sample
+                try:
+                    humidity, temperature = self.dht.humidity, self.dht.temperature
+                except RuntimeError as e:
+                    # Checksum and timing misses are routine with the DHT11
+                    logger.warning("DHT11 read failed: %s", e)
+                    return None, None
+                finally:
+                    # Taken after the driver's own timestamp, so this never undercounts its wait
+                    self._dht_last_read = time.monotonic()
+            else:
+                humidity, temperature = Adafruit_DHT.read(Adafruit_DHT.DHT11, self.data_pin)
             
             if humidity is not None and temperature is not None:
                 # Validate DHT11 ranges
                 if 20 <= humidity <= 95 and 0 <= temperature <= 60:
                     return round(humidity, 1), round(temperature, 1)
                 else:
-                    logger.warning(f"DHT11 values out of range: H={humidity}%, T={temperature}°C")
+                    logger.warning("DHT11 values out of range: H=%s%%, T=%s°C", humidity, temperature)
                     return None, None
             else:
                 logger.warning("DHT11 returned None values")
                 return None, None
                 
         except Exception as e:
-            logger.error(f"DHT11 sensor error: {e}")
+            logger.error("DHT11 sensor error: %s", e)
             return None, None
 
 
     def update_reading(self):
         """Update temperature and humidity readings and check for alerts"""
+        # read_sensor's per-sensor alock already keeps reads from overlapping
         humidity, temperature = self.read_temp_humidity()
         if humidity is not None and temperature is not None:
             with self.lock:
                 self.humidity = round(humidity, 2)
                 self.temperature = round(temperature, 2)
-                self.last_reading_time = datetime.now(timezone.utc)
+                self.stamp()
                 
-                if temperature > self.temp_high_threshold:
-                    alert = self.generate_alert(
+                if self.in_alert('temperature', 'Temperature_High',
+                                 temperature > self.temp_high_threshold,
+                                 temperature > self.temp_high_exit):
+                    self.raise_on_change(
+                        'temperature',
                         "Temperature Alert",
                         f"High temperature detected: {temperature}°C",
                         "Temperature_High"
                     )
-                    self.alerts.append(alert)
-                elif temperature < self.temp_low_threshold:
-                    alert = self.generate_alert(
+                elif self.in_alert('temperature', 'Temperature_Low',
+                                   temperature < self.temp_low_threshold,
+                                   temperature < self.temp_low_exit):
+                    self.raise_on_change(
+                        'temperature',
                         "Temperature Alert",
                         f"Low temperature detected: {temperature}°C",
                         "Temperature_Low"
                     )
-                    self.alerts.append(alert)
+                else:
+                    self.raise_on_change('temperature')
                     
-                if humidity > self.humidity_high_threshold:
-                    alert = self.generate_alert(
+                if self.in_alert('humidity', 'Humidity_High',
+                                 humidity > self.humidity_high_threshold,
+                                 humidity > self.humidity_high_exit):
+                    self.raise_on_change(
+                        'humidity',
                         "Humidity Alert",
                         f"High humidity detected: {humidity}%",
                         "Humidity_High"
                     )
-                    self.alerts.append(alert)
-                elif humidity < self.humidity_low_threshold:
-                    alert = self.generate_alert(
+                elif self.in_alert('humidity', 'Humidity_Low',
+                                   humidity < self.humidity_low_threshold,
+                                   humidity < self.humidity_low_exit):
+                    self.raise_on_change(
+                        'humidity',
                         "Humidity Alert",
                         f"Low humidity detected: {humidity}%",
                         "Humidity_Low"
                     )
-                    self.alerts.append(alert)
+                else:
+                    self.raise_on_change('humidity')
+                
+                self.publish()
                     
-    def get_reading(self) -> Dict:
-        """Get current temperature and humidity reading"""
-        with self.lock:
-            return {
-                'sensor_type': 'temperature_humidity',
-                'sensor_id': self.sensor_id,
-                'temperature_celsius': self.temperature,
-                'temperature_fahrenheit': round((self.temperature * 9/5) + 32, 2),
-                'humidity_percent': self.humidity,
-                'timestamp': self.last_reading_time.isoformat() if self.last_reading_time else None,
-                'status': 'active' if self.last_reading_time else 'no_reading',
-                'pins': {'data': self.data_pin}
-            }
+    def build_reading(self) -> Dict:
+        """Build current temperature and humidity reading"""
+        return {
+            'sensor_type': 'temperature_humidity',
+            'sensor_id': self.sensor_id,
+            'temperature_celsius': self.temperature,
+            'temperature_fahrenheit': round((self.temperature * 9/5) + 32, 2),
+            'humidity_percent': self.humidity,
+            'timestamp': self.last_reading_time,
+            'status': 'active' if self.last_reading_time else 'no_reading',
+            'pins': {'data': self.data_pin}
+        }
 
 class LDRSensor(BaseSensor):
+    period = 0.5
+    rc_period = 4.0  # the Python RC loop spins for up to 2s; keep it under half of each period
+    
     def __init__(self, sensor_id: str = "LDR-01", asset_id: str = "LIGHT-SENSOR-01", 
-                 ldr_pin: int = 21):
+                 ldr_pin: int = 21, adc_channel: Optional[int] = None):
         super().__init__(sensor_id, asset_id)
         self.ldr_pin = ldr_pin
+        self.adc_channel = adc_channel  # MCP3008 channel for the LDR divider, replaces rc_time
         self.light_level = 0
         self.light_percentage = 0.0
         self.dark_threshold = 20.0  # Below 20% is considered dark
         self.bright_threshold = 80.0  # Above 80% is considered very bright
+        self.dark_exit = 25.0    # Alerts clear only once light moves back past these
+        self.bright_exit = 75.0
+        if self.adc_channel is None and pi is None:
+            self.period = self.rc_period
         
         self.setup_pins()
+        self.publish()
         
     def setup_pins(self):
         """Setup GPIO pins for LDR sensor"""
-        if not SIMULATION_MODE:
-            try:
-                GPIO.setmode(GPIO.BCM)
-                # Pin will be configured dynamically in rc_time
-            except Exception as e:
-                logger.error(f"Error setting up LDR pins: {e}")
+        # Nothing to do up front: the pin is configured dynamically in rc_time
         
     def read_light_level(self) -> Optional[tuple]:
         """Read light level from LDR sensor"""
@@ -435,9 +805,16 @@ class LDRSensor(BaseSensor):
             return None, None  # Return None instead of random values
             
         try:
-            GPIO.setmode(GPIO.BCM)
+            if self.adc_channel is not None:
+                # LDR on the 3.3V side of the divider: more light, higher voltage
+                raw_reading = read_adc(self.adc_channel)
+                return raw_reading, round(100 * raw_reading / 1023, 2)
             
             def rc_time():
+                if pi is not None:
+                    # Converted onto the loop-count scale max_dark/min_bright are tuned for
+                    return min(round(rc_charge_us(self.ldr_pin, 0.1, 2.0) / RC_LOOP_US), 1000000)
+                
                 count = 0
                 # Discharge capacitor
                 GPIO.setup(self.ldr_pin, GPIO.OUT)
@@ -446,11 +823,13 @@ class LDRSensor(BaseSensor):
                 
                 # Count time to charge
                 GPIO.setup(self.ldr_pin, GPIO.IN)
-                start_time = time.time()
+                # Locals keep lookups out of the loop so the count tracks charge time
+                gpio_input, now, pin, low = GPIO.input, time.perf_counter_ns, self.ldr_pin, GPIO.LOW
+                deadline = now() + 2_000_000_000  # 2s timeout
                 
-                while GPIO.input(self.ldr_pin) == GPIO.LOW:
+                while gpio_input(pin) == low:
                     count += 1
-                    if count > 1000000 or (time.time() - start_time) > 2:
+                    if count > 1000000 or now() > deadline:
                         break
                 
                 return count
@@ -476,7 +855,7 @@ class LDRSensor(BaseSensor):
                 return None, None
                 
         except Exception as e:
-            logger.error(f"LDR sensor error: {e}")
+            logger.error("LDR sensor error: %s", e)
             return None, None
 
 
@@ -489,44 +868,53 @@ class LDRSensor(BaseSensor):
                 with self.lock:
                     self.light_level = raw_value
                     self.light_percentage = percentage
-                    self.last_reading_time = datetime.now(timezone.utc)
+                    self.stamp()
                     
-                    if percentage < self.dark_threshold:
-                        alert = self.generate_alert(
+                    if self.in_alert('light', 'Light_Dark',
+                                     percentage < self.dark_threshold, percentage < self.dark_exit):
+                        self.raise_on_change(
+                            'light',
                             "Light Level Alert",
                             f"Dark environment detected: {percentage}% light level",
                             "Light_Dark"
                         )
-                        self.alerts.append(alert)
-                    elif percentage > self.bright_threshold:
-                        alert = self.generate_alert(
+                    elif self.in_alert('light', 'Light_Bright',
+                                       percentage > self.bright_threshold,
+                                       percentage > self.bright_exit):
+                        self.raise_on_change(
+                            'light',
                             "Light Level Alert",
                             f"Very bright environment detected: {percentage}% light level",
                             "Light_Bright"
                         )
-                        self.alerts.append(alert)
+                    else:
+                        self.raise_on_change('light')
                     
-    def get_reading(self) -> Dict:
-        """Get current light level reading"""
-        with self.lock:
-            light_condition = "Normal"
-            if self.light_percentage < self.dark_threshold:
-                light_condition = "Dark"
-            elif self.light_percentage > self.bright_threshold:
-                light_condition = "Very Bright"
+                    self.publish()
+                    
+    def build_reading(self) -> Dict:
+        """Build current light level reading"""
+        light_condition = "Normal"
+        if self.light_percentage < self.dark_threshold:
+            light_condition = "Dark"
+        elif self.light_percentage > self.bright_threshold:
+            light_condition = "Very Bright"
                 
-            return {
-                'sensor_type': 'light_sensor',
-                'sensor_id': self.sensor_id,
-                'light_level_raw': self.light_level,
-                'light_percentage': self.light_percentage,
-                'light_condition': light_condition,
-                'timestamp': self.last_reading_time.isoformat() if self.last_reading_time else None,
-                'status': 'active' if self.last_reading_time else 'no_reading',
-                'pins': {'ldr': self.ldr_pin}
-            }
+        return {
+            'sensor_type': 'light_sensor',
+            'sensor_id': self.sensor_id,
+            'light_level_raw': self.light_level,
+            'light_percentage': self.light_percentage,
+            'light_condition': light_condition,
+            'timestamp': self.last_reading_time,
+            'status': 'active' if self.last_reading_time else 'no_reading',
+            'pins': {'ldr': self.ldr_pin}
+        }
 
 class PIRSensor(BaseSensor):
+    time_varying = True  # time_since_motion_seconds grows between motion events
+    period = 0.02  # only used when edge detection is unavailable
+    
     def __init__(self, sensor_id: str = "PIR-01", asset_id: str = "MOTION-SENSOR-01", 
                  data_pin: int = 23):
         super().__init__(sensor_id, asset_id)
@@ -534,19 +922,82 @@ class PIRSensor(BaseSensor):
         self.motion_detected = False
         self.motion_count = 0
         self.last_motion_time = None
+        self.last_motion_mono = None  # monotonic twin of last_motion_time for elapsed times
         self.motion_timeout = 30  # seconds - alert if no motion for this long
+        self.timeout_alerted = False
+        self.edge_detect = False
+        self.pigpio_cbs = []
+        self.pin_backend = None  # 'pigpio' or 'gpio' once the pin is configured
         
         self.setup_pins()
+        self.publish()
         
     def setup_pins(self):
-        """Setup GPIO pins for PIR sensor"""
+        """Setup GPIO pins for PIR sensor; edge callbacks are armed later by arm_edges"""
+        if pi is not None:
+            try:
+                pi.set_mode(self.data_pin, pigpio.INPUT)
+                time.sleep(2)  # PIR sensor warm-up time
+                # Level must hold 200ms before pigpiod reports it, filtering PIR chatter
+                pi.set_glitch_filter(self.data_pin, 200_000)
+                self.pin_backend = 'pigpio'
+                return
+            except Exception as e:
+                logger.error("Error setting up PIR pin with pigpio: %s", e)
+        
         if not SIMULATION_MODE:
             try:
-                GPIO.setmode(GPIO.BCM)
                 GPIO.setup(self.data_pin, GPIO.IN)
                 time.sleep(2)  # PIR sensor warm-up time
+                self.pin_backend = 'gpio'
+            except Exception as e:
+                logger.error("Error setting up PIR pins: %s", e)
+    
+    def arm_edges(self):
+        """Record motion changes as they happen instead of sampling the pin
+        
+        Called from startup once the response cache exists, since the callbacks
+        invalidate it.
+        """
+        if self.pin_backend == 'pigpio':
+            try:
+                self.pigpio_cbs = [
+                    pi.callback(self.data_pin, pigpio.RISING_EDGE, self._on_pigpio_motion),
+                    pi.callback(self.data_pin, pigpio.FALLING_EDGE, self._on_pigpio_motion),
+                ]
+                self.edge_detect = True
+                self.polled = False
+                self.apply_motion(bool(pi.read(self.data_pin)))  # initial state
             except Exception as e:
-                logger.error(f"Error setting up PIR pins: {e}")
+                logger.error("PIR pigpio callbacks unavailable, falling back to polling: %s", e)
+        elif self.pin_backend == 'gpio':
+            try:
+                # 200ms debounce filters PIR chatter, especially during warm-up
+                GPIO.add_event_detect(self.data_pin, GPIO.BOTH, callback=self._on_motion_edge,
+                                      bouncetime=200)
+                self.edge_detect = True
+                self.polled = False
+                self.apply_motion(bool(GPIO.input(self.data_pin)))  # initial state
+            except RuntimeError as e:
+                logger.warning("PIR edge detection unavailable, falling back to polling: %s", e)
+    
+    def _on_motion_edge(self, channel):
+        """Apply a motion change as soon as the pin flips"""
+        try:
+            self.apply_motion(bool(GPIO.input(channel)))
+            invalidate_cache(self)
+        except Exception as e:
+            logger.error("PIR edge callback error: %s", e)
+    
+    def _on_pigpio_motion(self, gpio, level, tick):
+        """Apply the level pigpiod reports with the edge, so short pulses aren't lost"""
+        # An exception here would kill pigpio's callback thread, shared by every sensor
+        try:
+            if level in (0, 1):
+                self.apply_motion(bool(level))
+                invalidate_cache(self)
+        except Exception as e:
+            logger.error("PIR pigpio callback error: %s", e)
         
     def read_motion(self) -> Optional[bool]:
         """Read motion detection from PIR sensor"""
@@ -554,71 +1005,95 @@ class PIRSensor(BaseSensor):
             return None  # Return None instead of random values
             
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.data_pin, GPIO.IN)
-            
             # PIR output is HIGH when motion detected
+            if self.pin_backend == 'pigpio':
+                # The pin was set up through pigpiod, so RPi.GPIO doesn't own it
+                return bool(pi.read(self.data_pin))
             motion = GPIO.input(self.data_pin)
             return bool(motion)
             
         except Exception as e:
-            logger.error(f"PIR sensor error: {e}")
+            logger.error("PIR sensor error: %s", e)
             return None
 
             
     def update_reading(self):
         """Update motion detection and check for alerts"""
         motion = self.read_motion()
+        if motion is not None:  # a failed read says nothing about motion
+            self.apply_motion(motion)
+    
+    def apply_motion(self, motion: Optional[bool]):
+        """Record the current motion state and raise alerts on changes"""
         current_time = datetime.now(timezone.utc)
         
         with self.lock:
-            self.last_reading_time = current_time
+            self.stamp(current_time)
             
             if motion:
                 if not self.motion_detected:  # Motion just started
                     self.motion_count += 1
+                    self.timeout_alerted = False
                     alert = self.generate_alert(
                         "Motion Detected",
                         f"Motion detected by sensor. Total detections: {self.motion_count}",
-                        "Motion_Detected"
+                        "Motion_Detected",
+                        date=self.last_reading_time
                     )
                     self.alerts.append(alert)
                 
                 self.motion_detected = True
                 self.last_motion_time = current_time
+                self.last_motion_mono = time.monotonic()
             else:
                 self.motion_detected = False
-                
-                # Check for no motion timeout
-                if (self.last_motion_time and 
-                    (current_time - self.last_motion_time).total_seconds() > self.motion_timeout):
-                    alert = self.generate_alert(
-                        "No Motion Alert",
-                        f"No motion detected for over {self.motion_timeout} seconds",
-                        "Motion_Timeout"
-                    )
-                    self.alerts.append(alert)
+            
+            self.publish()
+    
+    def check_motion_timeout(self) -> bool:
+        """Raise one alert once motion has been absent for motion_timeout seconds"""
+        now = time.monotonic()
+        with self.lock:
+            if (self.motion_detected or self.timeout_alerted or self.last_motion_mono is None or
+                now - self.last_motion_mono <= self.motion_timeout):
+                return False
+            
+            alert = self.generate_alert(
+                "No Motion Alert",
+                f"No motion detected for over {self.motion_timeout} seconds",
+                "Motion_Timeout"
+            )
+            self.alerts.append(alert)
+            self.timeout_alerted = True
+            self.publish()
+            return True
                     
+    def build_reading(self) -> Dict:
+        """Build current motion detection status"""
+        return {
+            'sensor_type': 'motion_sensor',
+            'sensor_id': self.sensor_id,
+            'motion_detected': self.motion_detected,
+            'motion_count': self.motion_count,
+            'last_motion_time': self.last_motion_time,
+            'time_since_motion_seconds': None,  # filled in by get_reading
+            'timestamp': self.last_reading_time,
+            'status': 'active' if self.last_reading_time else 'no_reading',
+            'pins': {'data': self.data_pin}
+        }
+    
     def get_reading(self) -> Dict:
-        """Get current motion detection status"""
-        with self.lock:
-            time_since_motion = None
-            if self.last_motion_time:
-                time_since_motion = (datetime.now(timezone.utc) - self.last_motion_time).total_seconds()
-                
-            return {
-                'sensor_type': 'motion_sensor',
-                'sensor_id': self.sensor_id,
-                'motion_detected': self.motion_detected,
-                'motion_count': self.motion_count,
-                'last_motion_time': self.last_motion_time.isoformat() if self.last_motion_time else None,
-                'time_since_motion_seconds': round(time_since_motion, 2) if time_since_motion else None,
-                'timestamp': self.last_reading_time.isoformat() if self.last_reading_time else None,
-                'status': 'active' if self.last_reading_time else 'no_reading',
-                'pins': {'data': self.data_pin}
-            }
+        """Latest published status, with the time since motion measured now"""
+        reading = self._snapshot
+        last_motion_mono = self.last_motion_mono
+        if last_motion_mono is None:
+            return reading
+        reading = reading.copy()
+        reading['time_since_motion_seconds'] = round(time.monotonic() - last_motion_mono, 2)
+        return reading
 
 # Initialize sensors with direct GPIO pins
+# With an MCP3008 wired up, pass adc_channel=N to MQ135Sensor/LDRSensor instead of using RC timing
 ultrasonic_sensor = UltrasonicSensor(trigger_pin=18, echo_pin=24)
 mq135_sensor = MQ135Sensor(digital_pin=25, analog_pin=26)
 dht11_sensor = DHT11Sensor(data_pin=22)
@@ -633,12 +1108,92 @@ sensors = {
     'pir': pir_sensor
 }
 
+# Serialized readings and alerts; None marks an entry stale, and the next request for it
+# re-encodes it. Timestamps stay datetimes until here; orjson writes them in the same
+# ISO 8601 form as isoformat()
+cache_lock = Lock()
+_cached = {'alerts': None, 'per_sensor': {}, 'config': b'', 'config_etag': ''}
+_sensor_types = {sensor: sensor_type for sensor_type, sensor in sensors.items()}
+
+def encode_response(data: List[Dict]) -> bytes:
+    """Serialize a data list in the API response envelope"""
+    return orjson.dumps({"data": data, "shouldSubscribe": "true"})
+
+def wrap_entries(entries: List[bytes]) -> bytes:
+    """Join already-serialized readings into the same envelope encode_response writes"""
+    return b'{"data":[' + b','.join(entries) + b'],"shouldSubscribe":"true"}'
+
+def collect_alerts() -> List[Dict]:
+    """Latest 10 alerts of each sensor, newest first"""
+    recent = []
+    for sensor in sensors.values():
+        with sensor.lock:
+            recent.append(list(itertools.islice(reversed(sensor.alerts), 10)))
+    # Each sensor's alerts are already newest first, so merge instead of sorting
+    return list(heapq.merge(*recent, key=itemgetter('Date'), reverse=True))
+
+def invalidate_cache(sensor: BaseSensor):
+    """Mark a sensor's reading and the alerts stale; cheap enough for GPIO callbacks"""
+    with cache_lock:
+        _cached['per_sensor'][_sensor_types[sensor]] = None
+        _cached['alerts'] = None
+
+def reading_entry(sensor_type: str) -> bytes:
+    """One serialized reading, re-encoded only if it changed since the last request
+    
+    Call with cache_lock held. Time-varying readings are encoded fresh every time.
+    """
+    sensor = sensors[sensor_type]
+    if sensor.time_varying:
+        return orjson.dumps(sensor.get_reading())
+    content = _cached['per_sensor'].get(sensor_type)
+    if content is None:
+        content = orjson.dumps(sensor.get_reading())
+        _cached['per_sensor'][sensor_type] = content
+    return content
+
+def sensor_body(sensor_type: str) -> bytes:
+    """One sensor's serialized reading in the response envelope"""
+    with cache_lock:
+        return wrap_entries([reading_entry(sensor_type)])
+
+def all_sensors_body() -> bytes:
+    """Serialized readings of every sensor"""
+    with cache_lock:
+        return wrap_entries([reading_entry(sensor_type) for sensor_type in sensors])
+
+def alerts_body() -> bytes:
+    """Serialized recent alerts of every sensor"""
+    with cache_lock:
+        if _cached['alerts'] is None:
+            _cached['alerts'] = encode_response(collect_alerts())
+        return _cached['alerts']
+
+# One worker per sensor: a slow DHT11 retry never queues the other sensors' reads
+sensor_pool = ThreadPoolExecutor(max_workers=len(sensors), thread_name_prefix="sensor")
+
+async def read_sensor(sensor: BaseSensor):
+    """Run a blocking hardware read in the sensor pool, one read at a time per sensor"""
+    async with sensor.alock:
+        await asyncio.get_running_loop().run_in_executor(sensor_pool, sensor.update_reading)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the background readers for the life of the server, then release the GPIO"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
 app = FastAPI(
     title="Multi-Sensor IoT API - Direct GPIO",
     description="REST API for Ultrasonic, MQ-135, DHT11, LDR, and PIR sensors on Raspberry Pi with direct GPIO connections",
     version="2.1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 origins = ["*"]  # This allows all origins
@@ -652,103 +1207,100 @@ app.add_middleware(
 )
 
 # Middleware to add ngrok bypass headers
-@app.middleware("http")
-async def add_ngrok_bypass_headers(request: Request, call_next):
-    response = await call_next(request)
+class NgrokBypassHeadersMiddleware:
+    """Pure ASGI middleware that appends the ngrok bypass headers to every response"""
+    headers = [
+        (b"ngrok-skip-browser-warning", b"true"),
+        (b"user-agent", b"CustomSensorAPI/1.0"),
+    ]
     
-    # Add ngrok bypass headers to all responses
-    response.headers["ngrok-skip-browser-warning"] = "true"
-    response.headers["User-Agent"] = "CustomSensorAPI/1.0"
+    def __init__(self, app):
+        self.app = app
     
-    return response
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + self.headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(NgrokBypassHeadersMiddleware)
 
-@app.get("/sensors", response_class=PlainTextResponse)
+def json_bytes_response(content: bytes, request: Request) -> Response:
+    """Serve compact JSON bytes, indented when a human asks with ?pretty=1"""
+    if request.query_params.get('pretty', '').lower() in ('1', 'true', 'yes'):
+        content = orjson.dumps(orjson.loads(content), option=orjson.OPT_INDENT_2)
+    return Response(content=content, media_type="application/json")
+
+@app.get("/sensors", response_class=ORJSONResponse)
 async def get_all_sensors(request: Request):
     try:
-        readings = []
-        for sensor_type, sensor in sensors.items():
-            readings.append(sensor.get_reading())
-        response = ApiResponse(data=readings, shouldSubscribe="true")
-        
-        # Create response with ngrok bypass headers
-        content = json.dumps(response.dict(), indent=2)
-        headers = {
-            "ngrok-skip-browser-warning": "true",
-            "User-Agent": "CustomSensorAPI/1.0"
-        }
-        return PlainTextResponse(content=content, headers=headers)
+        content = all_sensors_body()
+        return json_bytes_response(content, request)
     except Exception as e:
-        logger.error(f"Error getting all sensors: {e}")
+        logger.error("Error getting all sensors: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/sensors/alerts", response_class=PlainTextResponse)
+@app.get("/sensors/alerts", response_class=ORJSONResponse)
 async def get_sensor_alerts(request: Request):
     try:
-        all_alerts = []
-        for sensor in sensors.values():
-            with sensor.lock:
-                all_alerts.extend(sensor.alerts[-10:])
-        all_alerts.sort(key=lambda x: x['Date'], reverse=True)
-        response = ApiResponse(data=all_alerts, shouldSubscribe="true")
-        
-        # Create response with ngrok bypass headers
-        content = json.dumps(response.dict(), indent=2)
-        headers = {
-            "ngrok-skip-browser-warning": "true",
-            "User-Agent": "CustomSensorAPI/1.0"
-        }
-        return PlainTextResponse(content=content, headers=headers)
+        content = alerts_body()
+        return json_bytes_response(content, request)
     except Exception as e:
-        logger.error(f"Error getting sensor alerts: {e}")
+        logger.error("Error getting sensor alerts: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/sensors/{sensor_type}", response_class=PlainTextResponse)
+@app.get("/sensors/{sensor_type}", response_class=ORJSONResponse)
 async def get_sensor(sensor_type: str, request: Request):
     if sensor_type not in sensors:
         raise HTTPException(status_code=404, detail=f"Sensor type '{sensor_type}' not found. Available: {list(sensors.keys())}")
     try:
-        reading = [sensors[sensor_type].get_reading()]
-        response = ApiResponse(data=reading, shouldSubscribe="true")
-        
-        # Create response with ngrok bypass headers
-        content = json.dumps(response.dict(), indent=2)
-        headers = {
-            "ngrok-skip-browser-warning": "true",
-            "User-Agent": "CustomSensorAPI/1.0"
-        }
-        return PlainTextResponse(content=content, headers=headers)
+        content = sensor_body(sensor_type)
+        return json_bytes_response(content, request)
     except Exception as e:
-        logger.error(f"Error getting {sensor_type} sensor: {e}")
+        logger.error("Error getting %s sensor: %s", sensor_type, e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/sensors/{sensor_type}/live", response_class=PlainTextResponse)
+@app.get("/sensors/{sensor_type}/live", response_class=ORJSONResponse)
 async def get_live_sensor(sensor_type: str, request: Request):
+    """Take a fresh reading now, queued behind any read already in progress on that sensor
+    
+    If the read fails (e.g. a DHT11 checksum miss) the latest good reading is returned.
+    Edge-driven sensors (polled=False) are already current, so they are served as-is.
+    """
     if sensor_type not in sensors:
         raise HTTPException(status_code=404, detail=f"Sensor type '{sensor_type}' not found. Available: {list(sensors.keys())}")
     try:
-        sensors[sensor_type].update_reading()
-        reading = [sensors[sensor_type].get_reading()]
-        response = ApiResponse(data=reading, shouldSubscribe="true")
-        
-        # Create response with ngrok bypass headers
-        content = json.dumps(response.dict(), indent=2)
-        headers = {
-            "ngrok-skip-browser-warning": "true",
-            "User-Agent": "CustomSensorAPI/1.0"
-        }
-        return PlainTextResponse(content=content, headers=headers)
+        sensor = sensors[sensor_type]
+        if sensor.polled:
+            await read_sensor(sensor)
+            invalidate_cache(sensor)
+        content = sensor_body(sensor_type)
+        return json_bytes_response(content, request)
     except Exception as e:
-        logger.error(f"Error getting live {sensor_type} sensor: {e}")
+        logger.error("Error getting live %s sensor: %s", sensor_type, e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health", response_class=PlainTextResponse)
+HEALTH_TTL = 0.5  # seconds a serialized /health payload is reused
+_health_cache = {'bytes': b'', 'expires': 0.0}
+
+@app.get("/health", response_class=ORJSONResponse)
 async def health_check(request: Request):
+    # Monitors poll in bursts; nothing awaits between the check and the store,
+    # so concurrent requests on the event loop share one build
+    now = time.monotonic()
+    if now < _health_cache['expires']:
+        return json_bytes_response(_health_cache['bytes'], request)
     try:
         health_status = {}
         overall_healthy = True
         for sensor_type, sensor in sensors.items():
             try:
-                sensor.update_reading()
                 reading = sensor.get_reading()
                 is_healthy = reading['status'] == 'active'
                 health_status[sensor_type] = {
@@ -767,24 +1319,36 @@ async def health_check(request: Request):
         response = {
             'data': [{
                 'status': 'healthy' if overall_healthy else 'degraded',
-                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'timestamp': datetime.now(timezone.utc),
                 'sensors': health_status
             }],
             'shouldSubscribe': "true"
         }
-        # Create response with ngrok bypass headers
-        content = json.dumps(response, indent=2)
-        headers = {
-            "ngrok-skip-browser-warning": "true",
-            "User-Agent": "CustomSensorAPI/1.0"
-        }
-        return PlainTextResponse(content=content, headers=headers)
+        content = orjson.dumps(response)
+        _health_cache['bytes'] = content
+        _health_cache['expires'] = now + HEALTH_TTL
+        return json_bytes_response(content, request)
     except Exception as e:
-        logger.error(f"Health check error: {e}")
+        logger.error("Health check error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/config", response_class=PlainTextResponse)
+@app.get("/config", response_class=ORJSONResponse)
 async def get_config(request: Request):
+    # Sensor metadata is fixed once the pins are set up, so this is built at startup
+    # and clients can revalidate with If-None-Match instead of re-downloading it
+    etag = _cached['config_etag']
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=60'}
+    # If-None-Match may list several tags and uses weak comparison (RFC 9110)
+    candidates = {tag.strip().removeprefix('W/')
+                  for tag in request.headers.get('if-none-match', '').split(',')}
+    if '*' in candidates or etag.removeprefix('W/') in candidates:
+        return Response(status_code=304, headers=headers)
+    response = json_bytes_response(_cached['config'], request)
+    response.headers.update(headers)
+    return response
+
+def build_config() -> bytes:
+    """Serialize the static sensor configuration"""
     config = []
     for sensor_type, sensor in sensors.items():
         reading = sensor.get_reading()
@@ -792,60 +1356,116 @@ async def get_config(request: Request):
             'sensor_id': reading['sensor_id'],
             'sensor_type': reading['sensor_type'],
             'pins': reading['pins'],
-            'asset_id': sensor.asset_id
+            'asset_id': sensor.asset_id,
+            'update_interval_seconds': sensor.period if sensor.polled else None
         })
-    response = {
+    return orjson.dumps({
         'data': config,
         'shouldSubscribe': "true",
         'api_version': '2.1.0',
-        'update_interval': '1_second',
+        'update_interval': 'per_sensor',
         'connection_type': 'direct_gpio'
-    }
-    
-    # Create response with ngrok bypass headers
-    content = json.dumps(response, indent=2)
-    headers = {
-        "ngrok-skip-browser-warning": "true",
-        "User-Agent": "CustomSensorAPI/1.0"
-    }
-    return PlainTextResponse(content=content, headers=headers)
-
-def continuous_reading():
-    """Background task for continuous sensor readings"""
+    })
+
+async def sensor_loop(sensor: BaseSensor):
+    """Background task keeping one sensor's reading fresh at its own cadence"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    failures = 0
     while True:
         try:
-            for sensor in sensors.values():
-                sensor.update_reading()
-            time.sleep(1)  # Update every second
+            await read_sensor(sensor)
+            invalidate_cache(sensor)
+            failures = 0
+            
+            # Sleep to an absolute deadline so read time doesn't add drift
+            deadline += sensor.period
+            delay = deadline - loop.time()
+            if delay < 0:
+                # Overran the period; restart the schedule rather than bursting
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
         except Exception as e:
-            logger.error(f"Error in continuous reading: {e}")
-            time.sleep(5)
+            # Back off a sensor that keeps failing; the other loops carry on
+            failures += 1
+            backoff = min(5 * 2 ** (failures - 1), 60)
+            logger.error("Error in %s reading loop (retry in %ss): %s", sensor.sensor_id, backoff, e)
+            await asyncio.sleep(backoff)
+            deadline = loop.time()
+
+async def pir_timeout_watcher():
+    """Background task checking the PIR no-motion timeout every 5 seconds"""
+    while True:
+        await asyncio.sleep(5)
+        try:
+            if pir_sensor.check_motion_timeout():
+                invalidate_cache(pir_sensor)
+        except Exception as e:
+            logger.error("Error in PIR timeout watcher: %s", e)
+
+# Keep references so the tasks aren't garbage collected
+background_tasks = []
 
-@app.on_event("startup")
 async def startup_event():
     """Start background tasks when the app starts"""
-    reading_thread = Thread(target=continuous_reading, daemon=True)
-    reading_thread.start()
-    logger.info("Background reading thread started")
+    if not SIMULATION_MODE:
+        lock_memory()
+    # Before build_config and the loops, since arming decides whether PIR is polled
+    pir_sensor.arm_edges()
+    _cached['config'] = build_config()
+    # Weak, since ?pretty=1 serves the same config with different bytes
+    _cached['config_etag'] = f'W/"{hashlib.blake2b(_cached["config"], digest_size=8).hexdigest()}"'
+    for sensor in sensors.values():
+        # Created here so the locks bind to the server's event loop
+        sensor.alock = asyncio.Lock()
+        if sensor.polled:
+            background_tasks.append(asyncio.create_task(sensor_loop(sensor)))
+    background_tasks.append(asyncio.create_task(pir_timeout_watcher()))
+    logger.info("Background reading tasks started")
     logger.info("Multi-Sensor API Server started with 5 sensors - Direct GPIO connections")
 
+_gpio_released = False
+
 def cleanup_gpio():
-    """Proper GPIO cleanup"""
-    try:
-        if not SIMULATION_MODE:
-            GPIO.cleanup()
-            logger.info("GPIO cleaned up successfully")
-    except Exception as e:
-        logger.error(f"GPIO cleanup error: {e}")
+    """Release pigpio, the DHT helper and RPi.GPIO; later calls do nothing"""
+    global _gpio_released
+    if _gpio_released:
+        return
+    _gpio_released = True
+    
+    steps = []
+    if pi is not None:
+        steps.append(pi.stop)
+    if dht11_sensor.dht is not None:
+        steps.append(dht11_sensor.dht.exit)  # stops the libgpiod_pulsein helper process
+    if not SIMULATION_MODE:
+        steps.append(GPIO.cleanup)
+    
+    # One failing step shouldn't leave the remaining pins claimed
+    ok = True
+    for step in steps:
+        try:
+            step()
+        except Exception as e:
+            ok = False
+            logger.error("GPIO cleanup error: %s", e)
+    if ok and not SIMULATION_MODE:
+        logger.info("GPIO cleaned up successfully")
 
-@app.on_event("shutdown")
 async def shutdown_event():
     """Enhanced cleanup"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Let in-flight reads finish before releasing the pins, without blocking the loop
+    await asyncio.to_thread(sensor_pool.shutdown, wait=True)
     cleanup_gpio()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
+    # uvloop and httptools ship with uvicorn[standard]; both beat the pure-Python defaults
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
 
 # Fix 7: Install required packages
 """
@@ -855,10 +1475,17 @@ sudo apt update
 sudo apt install python3-pip
 pip3 install RPi.GPIO
 pip3 install Adafruit_DHT
-pip3 install fastapi uvicorn
+pip3 install fastapi "uvicorn[standard]" orjson
+
+# For microsecond edge timing (ultrasonic), run the pigpio daemon:
+sudo apt install pigpio python3-pigpio
+sudo systemctl enable --now pigpiod
 
 # For DHT sensor, you might also need:
 sudo apt install libgpiod2
+
+# Optional: the CircuitPython DHT driver (used instead of Adafruit_DHT when installed)
+pip3 install adafruit-circuitpython-dht
 """
 
 # Fix 8: Check your wiring connections
@@ -868,5 +1495,7 @@ Verify these connections:
 - MQ-135: VCC->5V, GND->GND, DO->GPIO25, AO->GPIO26 (with RC circuit)
 - DHT11: VCC->3.3V, GND->GND, DATA->GPIO22
 - LDR: One end to 3.3V, other to GPIO21 and through capacitor to GND
+- Optional MCP3008: VDD/VREF->3.3V, CLK->GPIO11, DOUT->GPIO9, DIN->GPIO10, CS->GPIO8 (CE0);
+  MQ-135 AO (divided to 3.3V) and the LDR divider go to its channels
 - PIR: VCC->5V, GND->GND, OUT->GPIO23
 """
\ No newline at end of file
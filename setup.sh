@@ -24,7 +24,9 @@ echo -e "${GREEN}Starting setup for FastAPI server and Cloudflare Tunnel...${NC}
 # Step 1: Update system and install dependencies
 echo -e "${GREEN}Installing system dependencies...${NC}"
 sudo apt update
-sudo apt install -y python3 python3-pip python3-venv wget curl
+sudo apt install -y python3 python3-pip python3-venv wget curl pigpio
+# pigpiod timestamps sensor edges for server.py (optional, falls back to RPi.GPIO)
+sudo systemctl enable --now pigpiod
 
 # Step 2: Create working directory
 echo -e "${GREEN}Setting up working directory at $WORKDIR...${NC}"
@@ -41,6 +43,10 @@ RPi.GPIO==0.7.1
 Adafruit-DHT==1.4.0
 spidev==3.6
 python-multipart==0.0.6
+orjson==3.9.10
+pigpio==1.78
+uvloop==0.19.0
+httptools==0.6.1
 EOL
 
 # Step 4: Copy server.py if it exists, otherwise create a basic one
@@ -169,7 +175,7 @@ echo -e "${GREEN}Creating systemd service for FastAPI server...${NC}"
 sudo bash -c "cat > /etc/systemd/system/sensor-server.service" << EOL
 [Unit]
 Description=FastAPI Sensor Server
-After=network.target
+After=network.target pigpiod.service
 Wants=cloudflared.service
 
 [Service]
@@ -179,7 +185,13 @@ Group=$PI_USER
 WorkingDirectory=$WORKDIR
 Environment="PATH=$VENV_DIR/bin"
 Environment="PYTHONPATH=$WORKDIR"
-ExecStart=$VENV_DIR/bin/uvicorn server:app --host 0.0.0.0 --port $SERVER_PORT --reload
+# Real-time priority and locked memory for the sensor timing loops
+AmbientCapabilities=CAP_SYS_NICE CAP_IPC_LOCK
+LimitRTPRIO=99
+LimitMEMLOCK=infinity
+# One worker only: the sensor loops own the GPIO pins. No --reload, its file watcher
+# only costs CPU in production
+ExecStart=$VENV_DIR/bin/uvicorn server:app --host 0.0.0.0 --port $SERVER_PORT --loop uvloop --http httptools
 Restart=always
 RestartSec=10
 
@@ -0,0 +1,49 @@
+#!/bin/bash
+
+# Reserve one CPU core for sensor timing (used by debug_sensors.py)
+# Keeps the scheduler tick, RCU callbacks and device interrupts off that core.
+
+# Exit on any error
+set -e
+
+# Configuration variables (modify these as needed)
+SENSOR_CPU=3  # Core that debug_sensors.py pins itself to (SENSOR_CPU)
+IRQ_MASK=7    # Hex CPU mask for interrupts: cores 0-2
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+NC='\033[0m' # No Color
+
+# Bookworm moved the boot partition to /boot/firmware
+if [ -f /boot/firmware/cmdline.txt ]; then
+    CMDLINE="/boot/firmware/cmdline.txt"
+else
+    CMDLINE="/boot/cmdline.txt"
+fi
+
+# Step 1: Isolate the core at boot
+echo -e "${GREEN}Isolating CPU $SENSOR_CPU in $CMDLINE...${NC}"
+if grep -q "isolcpus=" "$CMDLINE"; then
+    echo -e "${YELLOW}isolcpus already set, leaving $CMDLINE unchanged${NC}"
+else
+    sudo cp "$CMDLINE" "$CMDLINE.bak"
+    sudo sed -i "1 s/\$/ isolcpus=$SENSOR_CPU nohz_full=$SENSOR_CPU rcu_nocbs=$SENSOR_CPU/" "$CMDLINE"
+    echo -e "${GREEN}Added isolcpus=$SENSOR_CPU nohz_full=$SENSOR_CPU rcu_nocbs=$SENSOR_CPU (backup: $CMDLINE.bak)${NC}"
+fi
+
+# Step 2: Keep irqbalance from moving interrupts back onto the core
+if systemctl list-unit-files | grep -q "^irqbalance"; then
+    echo -e "${GREEN}Disabling irqbalance...${NC}"
+    sudo systemctl disable --now irqbalance
+fi
+
+# Step 3: Route interrupts to the other cores
+echo -e "${GREEN}Routing interrupts to CPU mask $IRQ_MASK...${NC}"
+for irq in /proc/irq/*/smp_affinity; do
+    echo "$IRQ_MASK" | sudo tee "$irq" > /dev/null 2>&1 || true
+done
+
+echo -e "${GREEN}Done. Reboot for isolcpus to take effect.${NC}"
+echo -e "${YELLOW}Interrupt routing is reset on reboot; re-run this script afterwards.${NC}"
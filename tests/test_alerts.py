@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timezone
+
+from server import BaseSensor
+
+
+class ProbeSensor(BaseSensor):
+    """Smallest concrete sensor, so the alert logic can be driven directly"""
+    
+    def build_reading(self):
+        return {}
+
+
+class InAlertTest(unittest.TestCase):
+    def setUp(self):
+        self.sensor = ProbeSensor("PROBE-01", "PROBE-ASSET")
+    
+    def test_enter_condition_applies_while_inactive(self):
+        self.assertTrue(self.sensor.in_alert('temp', 'High', enter=True, stay=False))
+        self.assertFalse(self.sensor.in_alert('temp', 'High', enter=False, stay=True))
+    
+    def test_stay_condition_applies_once_active(self):
+        self.sensor._alert_state['temp'] = 'High'
+        self.assertTrue(self.sensor.in_alert('temp', 'High', enter=False, stay=True))
+        self.assertFalse(self.sensor.in_alert('temp', 'High', enter=True, stay=False))
+
+
+class RaiseOnChangeTest(unittest.TestCase):
+    def setUp(self):
+        self.sensor = ProbeSensor("PROBE-01", "PROBE-ASSET")
+        self.sensor.stamp()
+    
+    def raise_high(self, times=1):
+        for _ in range(times):
+            self.sensor.raise_on_change('temp', "Temperature Alert", "Too hot", 'High')
+    
+    def test_fires_after_persistence_reads(self):
+        self.raise_high(self.sensor.alert_persistence - 1)
+        self.assertEqual(len(self.sensor.alerts), 0)
+        self.raise_high()
+        self.assertEqual(len(self.sensor.alerts), 1)
+        alert = self.sensor.alerts[0]
+        self.assertEqual(alert['Failure_x0020_Class'], 'High')
+        self.assertEqual(alert['anchor'], "PROBE-ASSET")
+        self.assertEqual(alert['Date'], self.sensor.last_reading_time)
+    
+    def test_fires_once_while_class_holds(self):
+        self.raise_high(self.sensor.alert_persistence * 3)
+        self.assertEqual(len(self.sensor.alerts), 1)
+    
+    def test_interrupted_run_starts_over(self):
+        self.raise_high(self.sensor.alert_persistence - 1)
+        self.sensor.raise_on_change('temp', "Temperature Alert", "Too cold", 'Low')
+        self.raise_high(self.sensor.alert_persistence - 1)
+        self.assertEqual(len(self.sensor.alerts), 0)
+    
+    def test_cooldown_suppresses_quick_refire(self):
+        self.raise_high(self.sensor.alert_persistence)
+        for _ in range(self.sensor.alert_persistence):
+            self.sensor.raise_on_change('temp')  # settle back to no alert
+        self.assertIsNone(self.sensor._alert_state['temp'])
+        self.raise_high(self.sensor.alert_persistence)
+        self.assertEqual(len(self.sensor.alerts), 1)
+    
+    def test_refires_after_cooldown(self):
+        self.sensor.alert_cooldown = 0.0
+        self.raise_high(self.sensor.alert_persistence)
+        for _ in range(self.sensor.alert_persistence):
+            self.sensor.raise_on_change('temp')
+        self.raise_high(self.sensor.alert_persistence)
+        self.assertEqual(len(self.sensor.alerts), 2)
+        self.assertNotEqual(self.sensor.alerts[0]['id'], self.sensor.alerts[1]['id'])
+    
+    def test_keys_are_independent(self):
+        self.raise_high(self.sensor.alert_persistence - 1)
+        self.sensor.raise_on_change('humidity', "Humidity Alert", "Too humid", 'High')
+        self.raise_high()
+        self.assertEqual(len(self.sensor.alerts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
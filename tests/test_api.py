@@ -0,0 +1,113 @@
+"""API routes and response caching; fastapi.testclient needs httpx installed"""
+import unittest
+
+import orjson
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def setUpModule():
+    # The lifespan builds the config and starts the loops; it runs once per process
+    # because shutdown releases the sensor pool and the GPIO
+    client.__enter__()
+
+
+def tearDownModule():
+    client.__exit__(None, None, None)
+
+
+class ConfigTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.etag = client.get('/config').headers['etag']
+    
+    def get(self, if_none_match=None, params=None):
+        headers = {} if if_none_match is None else {'If-None-Match': if_none_match}
+        return client.get('/config', headers=headers, params=params)
+    
+    def assertNotModified(self, response):
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response.headers['etag'], self.etag)
+        self.assertEqual(response.headers['cache-control'], 'public, max-age=60')
+    
+    def test_full_response_carries_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.etag.startswith('W/"'))
+        self.assertEqual(response.headers['cache-control'], 'public, max-age=60')
+        self.assertEqual([entry['sensor_id'] for entry in response.json()['data']],
+                         [sensor.sensor_id for sensor in server.sensors.values()])
+    
+    def test_matching_etag_is_not_modified(self):
+        self.assertNotModified(self.get(self.etag))
+    
+    def test_weak_comparison_ignores_prefix(self):
+        self.assertNotModified(self.get(self.etag[2:]))
+    
+    def test_etag_in_list(self):
+        self.assertNotModified(self.get(f'"stale", {self.etag} ,"other"'))
+    
+    def test_wildcard(self):
+        self.assertNotModified(self.get('*'))
+    
+    def test_mismatch_sends_body(self):
+        response = self.get('"stale", W/"older"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['etag'], self.etag)
+    
+    def test_pretty_is_same_resource(self):
+        compact = self.get()
+        pretty = self.get(params={'pretty': '1'})
+        self.assertIn(b'\n', pretty.content)
+        self.assertNotIn(b'\n', compact.content)
+        self.assertEqual(pretty.json(), compact.json())
+        self.assertEqual(pretty.headers['etag'], self.etag)
+        self.assertNotIn(b'\n', self.get(params={'pretty': '0'}).content)
+
+
+class SensorBodyCacheTest(unittest.TestCase):
+    def test_entry_reused_until_invalidated(self):
+        with server.cache_lock:
+            first = server.reading_entry('ldr')
+            self.assertIs(server.reading_entry('ldr'), first)
+        server.invalidate_cache(server.ldr_sensor)
+        with server.cache_lock:
+            self.assertIsNot(server.reading_entry('ldr'), first)
+    
+    def test_envelope_matches_encode_response(self):
+        readings = [orjson.loads(orjson.dumps(sensor.get_reading()))
+                    for sensor in server.sensors.values()]
+        self.assertEqual(server.all_sensors_body(), server.encode_response(readings))
+    
+    def test_time_varying_reading_not_cached(self):
+        server.pir_sensor.last_motion_mono = server.time.monotonic() - 5
+        try:
+            reading = orjson.loads(server.sensor_body('pir'))['data'][0]
+        finally:
+            server.pir_sensor.last_motion_mono = None
+        self.assertGreaterEqual(reading['time_since_motion_seconds'], 5)
+        self.assertIsNone(server._cached['per_sensor'].get('pir'))
+
+
+class SensorRoutesTest(unittest.TestCase):
+    def test_pretty(self):
+        for path in ('/sensors', '/sensors/alerts', '/sensors/ldr', '/sensors/ldr/live'):
+            with self.subTest(path=path):
+                compact = client.get(path)
+                pretty = client.get(path, params={'pretty': 'true'})
+                self.assertNotIn(b'\n', compact.content)
+                self.assertIn(b'\n', pretty.content)
+                self.assertEqual(pretty.json()['data'][:1], compact.json()['data'][:1])
+    
+    def test_unknown_sensor(self):
+        self.assertEqual(client.get('/sensors/sonar').status_code, 404)
+        self.assertEqual(client.get('/sensors/sonar/live').status_code, 404)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+/*
+ * HC-SR04 echo timing for debug_sensors.py
+ * Polls GPLEV0 through the mmap'd /dev/gpiomem at C speed.
+ *
+ * Build on the Pi:
+ *   cc -O3 -shared -fPIC -o ultrasonic.so ultrasonic.c
+ */
+
+#include <fcntl.h>
+#include <stdint.h>
+#include <sys/mman.h>
+#include <time.h>
+#include <unistd.h>
+
+/* Word offsets into the GPIO register block */
+#define GPSET0 7
+#define GPCLR0 10
+#define GPLEV0 13
+
+static volatile uint32_t *gpio;
+
+static uint64_t now_ns(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000u + (uint64_t)ts.tv_nsec;
+}
+
+static int map_gpio(void)
+{
+    int fd;
+    void *mem;
+
+    if (gpio)
+        return 0;
+    fd = open("/dev/gpiomem", O_RDWR | O_SYNC);
+    if (fd < 0)
+        return -1;
+    mem = mmap(NULL, 4096, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (mem == MAP_FAILED)
+        return -1;
+    gpio = mem;
+    return 0;
+}
+
+/*
+ * Send a 10us trigger pulse and return the echo width in nanoseconds,
+ * or 0 on timeout or if the registers can't be mapped. The trigger pin
+ * must already be an output and the echo pin an input.
+ */
+uint64_t measure(unsigned trig, unsigned echo, uint64_t timeout_ns)
+{
+    uint32_t echo_mask = 1u << echo;
+    uint64_t start, deadline;
+
+    if (map_gpio() < 0)
+        return 0;
+
+    gpio[GPSET0] = 1u << trig;
+    deadline = now_ns() + 10000;
+    while (now_ns() < deadline)
+        ;
+    gpio[GPCLR0] = 1u << trig;
+
+    deadline = now_ns() + timeout_ns;
+    while (!(gpio[GPLEV0] & echo_mask))
+        if (now_ns() > deadline)
+            return 0;
+    start = now_ns();
+    while (gpio[GPLEV0] & echo_mask)
+        if (now_ns() > deadline)
+            return 0;
+    return now_ns() - start;
+}